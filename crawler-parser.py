@@ -3,7 +3,9 @@ import csv
 import requests
 import json
 import logging
+import time
 from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import concurrent.futures
 from dataclasses import dataclass, field, fields, asdict
@@ -20,15 +22,58 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def scrape_search_results(keyword, location, retries=3):
+def make_session(max_threads=5):
+    # One keep-alive connection pool for the whole run, sized to the worker threads, so each page
+    # reuses a connection to the proxy instead of paying a new TCP+TLS handshake
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_threads)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def deadline_expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def request_timeout(deadline, timeout=(10, 120)):
+    # Never wait on one response past the run deadline
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise Exception("Run deadline reached")
+    return (min(timeout[0], remaining), min(timeout[1], remaining))
+
+
+def fetch_page(url, deadline=None, session=None, chunk_size=16 * 1024):
+    # The read timeout applies to each socket read, not the whole body, so the body is read
+    # in chunks and given up on once the run deadline passes
+    response = (session or requests).get(url, timeout=request_timeout(deadline), stream=True)
+    try:
+        body = []
+        for chunk in response.iter_content(chunk_size):
+            if deadline_expired(deadline):
+                raise Exception(f"Run deadline reached while reading: {url}")
+            body.append(chunk)
+        response._content = b"".join(body)
+    finally:
+        response.close()
+    return response
+
+
+def scrape_search_results(keyword, location, retries=3, deadline=None, session=None):
     formatted_keyword = keyword.replace(" ", "+")
     url = f"https://www.etsy.com/search?q={formatted_keyword}&ref=pagination&"
     tries = 0
     success = False
     
     while tries <= retries and not success:
+        if deadline_expired(deadline):
+            logger.warning(f"Run deadline reached, giving up on: {url}")
+            return
         try:
-            response = requests.get(url)
+            response = fetch_page(url, deadline=deadline, session=session)
             logger.info(f"Recieved [{response.status_code}] from: {url}")
             if response.status_code != 200:
                 raise Exception(f"Failed request, Status Code {response.status_code}")
@@ -100,6 +145,9 @@ if __name__ == "__main__":
     MAX_THREADS = 5
     PAGES = 1
     LOCATION = "us"
+    ## Hard cap on the whole run in seconds: pages not started by then are skipped, requests in
+    ## flight are given up on by then
+    RUN_DEADLINE = 60 * 60
 
     logger.info(f"Crawl starting...")
 
@@ -107,10 +155,20 @@ if __name__ == "__main__":
     keyword_list = ["coffee mug"]
     aggregate_files = []
 
+    deadline = time.monotonic() + RUN_DEADLINE
+
+    ## Shared keep-alive connection pool for every fetch in the run
+    session = make_session(MAX_THREADS)
+
     ## Job Processes
     for keyword in keyword_list:
+        if deadline_expired(deadline):
+            logger.warning(f"Run deadline reached, skipping keyword: {keyword}")
+            continue
         filename = keyword.replace(" ", "-")
 
-        scrape_search_results(keyword, LOCATION, retries=MAX_RETRIES)
+        scrape_search_results(keyword, LOCATION, retries=MAX_RETRIES, deadline=deadline, session=session)
+
+    logger.info(f"Crawl complete.")
 
-    logger.info(f"Crawl complete.")
\ No newline at end of file
+    session.close()
@@ -0,0 +1,457 @@
+import os
+import sys
+import json
+import time
+import html as html_escape
+import statistics
+import collections
+import tracemalloc
+import importlib.util
+from datetime import date, timedelta
+from dataclasses import dataclass, fields, asdict
+
+
+## Load scraper-proxy.py as a module (its file name is not importable)
+SCRAPER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scraper-proxy.py")
+spec = importlib.util.spec_from_file_location("scraper_proxy", SCRAPER_PATH)
+scraper = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scraper)
+
+PARSERS = ["html.parser", "lxml"]
+## (parser, partial, structured) combinations; the first one is the reference the others are checked against.
+## The JSON-LD mode is checked on coerced records: the ItemList has no pre-sale price, and source differs by design
+MODES = [(parser, partial, False) for parser in PARSERS for partial in (False, True)] + [(None, False, True)]
+## Saved search-*.html / listing-*.html pages; fill it with `python parser-benchmark.py record "coffee mug"`
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser-corpus")
+## Small sanitized pages from the test suite, timed next to the synthetic ones when the corpus is empty
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+
+
+
+def page_kind(path):
+    return "listing" if "listing" in os.path.basename(path) else "search"
+
+
+def mode_name(parser, partial, structured):
+    if structured:
+        return "json-ld"
+    return f"{parser}{' partial' if partial else ''}"
+
+
+## Synthetic pages: same markup shape the extractors expect, for when no recorded corpus is available.
+## Like Etsy's pages they carry a JSON-LD block, a pagination nav above the grid, a grid split over two
+## lists and cards that wrap their content in a second wt-height-full block
+def synthetic_search_page(page_number, cards=48, pages=5):
+    card_markup = []
+    products = []
+    for rank in range(cards):
+        listing_id = 1000000 + page_number * 1000 + rank
+        url = f"https://www.etsy.com/listing/{listing_id}/mug-{listing_id}?ref=search"
+        stars = f'<span class="wt-text-title-small">4.{rank % 10}</span>' if rank % 3 else ""
+        original_price = f'<span class="currency-value">{30 + rank}.00</span>' if rank % 2 else ""
+        card = (
+            f'<a data-listing-id="{listing_id}" href="{url}">'
+            f'<h3 title="Synthetic mug {listing_id}" class="wt-text-caption">Synthetic mug {listing_id}</h3></a>'
+            f'<div>{stars}<p><span class="currency-symbol">$</span><span class="currency-value">{20 + rank}.00</span>{original_price}</p></div>'
+        )
+        if rank % 4 == 0:
+            card = f'<div class="wt-height-full wt-display-flex-xs">{card}</div>'
+        card_markup.append(f'<li><div class="wt-height-full"><div class="v2-listing-card">{card}</div></div></li>')
+        product = {"@type": "Product", "name": f"Synthetic mug {listing_id}", "url": url,
+                   "offers": {"@type": "Offer", "price": f"{20 + rank}.00", "priceCurrency": "USD"}}
+        if rank % 3:
+            product["aggregateRating"] = {"@type": "AggregateRating", "ratingValue": float(f"4.{rank % 10}")}
+        products.append({"@type": "ListItem", "position": rank + 1, "item": product})
+    json_ld = json.dumps({"@context": "https://schema.org", "@type": "ItemList", "itemListElement": products})
+    pagination = "".join(f'<a class="wt-action-group__item" data-page="{page}" href="?page={page}">{page}</a>' for page in range(1, pages + 1))
+    nav = f'<nav aria-label="Pagination of listings">{pagination}</nav>'
+    half = cards // 2
+    footer = "<p>Recommended for you</p>" * 500
+    return (
+        f'<html><head><meta charset="utf-8"><script type="application/ld+json">{json_ld}</script></head>'
+        f'<body><header>nav</header>{nav}<div data-search-results-region><ol>{"".join(card_markup[:half])}</ol>'
+        f'<h2>More from this search</h2><ol>{"".join(card_markup[half:])}</ol></div>'
+        f'{nav}<footer>{footer}</footer></body></html>'
+    ).encode("utf-8")
+
+
+def synthetic_listing_page(reviews=4):
+    review_markup = []
+    review_nodes = []
+    for rank in range(reviews):
+        published = date(2026, 1, 1) + timedelta(days=rank)
+        text = f"Synthetic review {rank} & more ☕"
+        review_markup.append(
+            f'<div id="review-text-width-{rank}"><div><input type="hidden" name="rating" value="{5 - rank % 2}">'
+            f'<p class="wt-text-body">{html_escape.escape(text)}</p>'
+            f'<div><p><a class="wt-text-link wt-mr-xs-1" aria-label="Reviewer Person {rank}" href="#">Person {rank}</a>'
+            f'{published:%b} {published.day}, {published.year}</p></div></div></div>'
+        )
+        review_nodes.append({"@type": "Review", "author": {"@type": "Person", "name": f"Person {rank}"},
+                             "datePublished": published.isoformat(), "reviewBody": text,
+                             "reviewRating": {"@type": "Rating", "ratingValue": 5 - rank % 2}})
+    json_ld = json.dumps({"@context": "https://schema.org", "@type": "Product", "name": "Synthetic listing", "review": review_nodes})
+    description = "<p>Listing description</p>" * 300
+    return (
+        f'<html><head><meta charset="utf-8"><script type="application/ld+json">{json_ld}</script></head>'
+        f'<body><h1>Synthetic listing</h1>{description}'
+        f'<div class="reviews">{"".join(review_markup)}</div><footer>footer</footer></body></html>'
+    ).encode("utf-8")
+
+
+def synthetic_corpus():
+    return [
+        ("synthetic search-1.html", "search", synthetic_search_page(1)),
+        ("synthetic listing-4.html", "listing", synthetic_listing_page(4)),
+        ("synthetic listing-40.html", "listing", synthetic_listing_page(40)),
+    ] + load_corpus(corpus_paths(FIXTURES_DIR))
+
+
+def load_corpus(paths):
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as page_file:
+            corpus.append((os.path.basename(path), page_kind(path), page_file.read()))
+    return corpus
+
+
+def corpus_paths(corpus_dir):
+    if not os.path.isdir(corpus_dir):
+        return []
+    return sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir)
+        if name.endswith(".html")
+    )
+
+
+def record_corpus(keyword, pages, listings_per_page, corpus_dir):
+    # Saves raw response bytes through the proxy so later runs (and CI) never touch Etsy
+    os.makedirs(corpus_dir, exist_ok=True)
+    fetcher = scraper.Fetcher()
+    slug = keyword.replace(" ", "-")
+    try:
+        for page_number in range(pages):
+            url = scraper.search_url(keyword, page_number)
+            response = fetcher.get(url)
+            if response.status_code != 200:
+                print(f"skipped {url}: status {response.status_code}")
+                continue
+            with open(os.path.join(corpus_dir, f"search-{slug}-{page_number + 1}.html"), "wb") as page_file:
+                page_file.write(response.content)
+            search_results, _ = scraper.parse_search_results(response.content, structured=False)
+            for search_data in search_results[:listings_per_page]:
+                listing = fetcher.get(search_data.url)
+                if listing.status_code != 200:
+                    print(f"skipped {search_data.url}: status {listing.status_code}")
+                    continue
+                with open(os.path.join(corpus_dir, f"listing-{search_data.listing_id}.html"), "wb") as page_file:
+                    page_file.write(listing.content)
+    finally:
+        fetcher.close()
+
+
+def extract(kind, html, parser, partial=False, structured=False):
+    if kind == "search":
+        search_results, _ = scraper.parse_search_results(html, parser, partial, structured)
+        return search_results
+    return scraper.parse_reviews(html, parser, partial, structured)
+
+
+def sniffed_text(body):
+    # What response.text does when the headers carry no charset: detect over the whole body, then decode a copy
+    encoding = scraper.requests.compat.chardet.detect(body)["encoding"] or "utf-8"
+    return str(body, encoding, errors="replace")
+
+
+def extract_from_text(kind, body):
+    return extract(kind, sniffed_text(body), None, True)
+
+
+def extract_from_bytes(kind, body):
+    return extract(kind, body, None, True)
+
+
+def stream_search(body, chunk_size=16 * 1024):
+    # Feeds the page in network-sized chunks; returns the records, seconds to the first one and bytes read
+    stream_parser = scraper.SearchStreamParser(structured=False)
+    records = []
+    first_record = None
+    bytes_read = 0
+    start = time.perf_counter()
+    for offset in range(0, len(body), chunk_size):
+        chunk = body[offset:offset + chunk_size]
+        bytes_read += len(chunk)
+        records.extend(stream_parser.feed(chunk))
+        if records and first_record is None:
+            first_record = time.perf_counter() - start
+        if stream_parser.done:
+            break
+    else:
+        records.extend(stream_parser.close())
+    if first_record is None:
+        first_record = time.perf_counter() - start
+    return records, first_record, bytes_read
+
+
+def time_rounds(func, *args, rounds=5):
+    timings = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def time_call(func, *args, rounds=5):
+    timings, result = time_rounds(func, *args, rounds=rounds)
+    return statistics.median(timings), result
+
+
+def time_parser(kind, html, parser, partial=False, structured=False, rounds=5):
+    return time_rounds(extract, kind, html, parser, partial, structured, rounds=rounds)
+
+
+def summarize(timings, record_count):
+    median_time = statistics.median(timings)
+    return {
+        "median": median_time,
+        "p95": scraper.percentile(timings, 95),
+        "per_record": median_time / record_count if record_count else 0.0,
+        "records_per_second": record_count / median_time if median_time else 0.0,
+    }
+
+
+def legacy_review_extraction(soup):
+    # The extractor before single-pass extraction: one select_one walk per rank, then per-card lookups
+    reviews = []
+    for review_rank in range(4):
+        review_card = soup.select_one(f"div[id='review-text-width-{review_rank}']")
+        if not review_card:
+            continue
+        rating = review_card.select_one("input[name='rating']").get("value")
+        review = review_card.find("p").text.strip()
+        name_date_holder = review_card.find("a", class_="wt-text-link wt-mr-xs-1")
+        if not name_date_holder:
+            continue
+        reviews.append((rating, review, name_date_holder.get("aria-label")))
+    return reviews
+
+
+def single_pass_review_extraction(soup):
+    reviews = []
+    for review_card in scraper.find_review_cards(soup):
+        rating, review, name_date_holder = scraper.extract_review_fields(review_card)
+        if rating is None or review is None or not name_date_holder:
+            continue
+        reviews.append((rating, review.text.strip(), name_date_holder.get("aria-label")))
+    return reviews
+
+
+def time_extraction(extractor, soup, rounds=5):
+    # Extraction only: the soup is built once, so this isolates the tree walks
+    timings = []
+    reviews = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        reviews = extractor(soup)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), reviews
+
+
+## The record types before slots: fields() reflection in every __post_init__ and a __dict__ per instance
+def legacy_check_string_fields(record):
+    for field in fields(record):
+        if isinstance(getattr(record, field.name), str):
+            if getattr(record, field.name) == "":
+                setattr(record, field.name, f"No {field.name}")
+                continue
+            value = getattr(record, field.name)
+            setattr(record, field.name, value.strip())
+
+
+@dataclass
+class LegacySearchData:
+    name: str = ""
+    stars: float = 0
+    url: str = ""
+    price_currency: str = ""
+    listing_id: int = 0
+    current_price: float = 0.0
+    original_price: float = 0.0
+    source: str = "dom"
+
+    def __post_init__(self):
+        legacy_check_string_fields(self)
+
+
+@dataclass
+class LegacyReviewData:
+    name: str = ""
+    date: str = ""
+    review: str = ""
+    stars: int = 0
+    source: str = "dom"
+
+    def __post_init__(self):
+        legacy_check_string_fields(self)
+
+
+SAMPLE_RECORDS = {
+    "search": dict(name=" Handmade coffee mug ", stars=4.8, url="https://www.etsy.com/listing/1/mug", price_currency="$",
+                   listing_id="1234567890", current_price="24.00", original_price="30.00"),
+    "listing": dict(name="Person", date="Mar 1, 2026", review=" Lovely mug, arrived quickly ", stars="5"),
+}
+
+
+def record_footprint(record_type, values, count):
+    # Construction time without tracing, then the memory the records keep alive
+    start = time.perf_counter()
+    records = [record_type(**values) for _ in range(count)]
+    seconds = time.perf_counter() - start
+    del records
+    tracemalloc.start()
+    records = [record_type(**values) for _ in range(count)]
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / count, retained / count
+
+
+def comparable(kind, records):
+    # Typed values without the fields the JSON-LD path cannot match
+    skipped = ("source", "original_price") if kind == "search" else ("source",)
+    return [
+        tuple(getattr(record, name) for name in record.field_names if name not in skipped)
+        for record in scraper.coerce_records(records)
+    ]
+
+
+def peak_memory_of(func, *args):
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def peak_memory(kind, html, parser, partial=False, structured=False):
+    return peak_memory_of(extract, kind, html, parser, partial, structured)
+
+
+
+if __name__ == "__main__":
+
+    ## Rounds per page and mode; p95 needs a few dozen to mean anything
+    ROUNDS = 30
+    RECORD_PAGES = 2
+    RECORD_COUNT = 100000
+    RECORD_LISTINGS_PER_PAGE = 5
+
+    ## INPUT ---> `record "KEYWORD"` to save pages through the proxy, otherwise pages to benchmark
+    ## (default: everything in CORPUS_DIR, or synthetic pages when the corpus is empty)
+    args = sys.argv[1:]
+    if args[:1] == ["record"]:
+        if len(args) != 2:
+            sys.exit('usage: python parser-benchmark.py record "KEYWORD"')
+        record_corpus(args[1], RECORD_PAGES, RECORD_LISTINGS_PER_PAGE, CORPUS_DIR)
+        sys.exit(0)
+
+    paths = args or corpus_paths(CORPUS_DIR)
+    if paths:
+        corpus = load_corpus(paths)
+    else:
+        print(f"No pages in {CORPUS_DIR}: timing SYNTHETIC and test fixture pages, which only approximate Etsy's markup")
+        corpus = synthetic_corpus()
+
+    # (kind, mode) -> per-page median seconds and the record count, for the corpus-wide summary
+    totals = collections.defaultdict(lambda: {"seconds": [], "records": 0})
+
+    for name, kind, html in corpus:
+        baseline_time = None
+        baseline_memory = None
+        baseline_records = None
+        for parser, partial, structured in MODES:
+            timings, records = time_parser(kind, html, parser, partial, structured, rounds=ROUNDS)
+            stats = summarize(timings, len(records))
+            median_time = stats["median"]
+            memory = peak_memory(kind, html, parser, partial, structured)
+            if baseline_records is None:
+                baseline_time, baseline_memory, baseline_records = median_time, memory, records
+            mode = mode_name(parser, partial, structured)
+            if structured and any(record.source != "json-ld" for record in records):
+                # No usable JSON-LD block: this row timed the DOM fallback
+                mode = "json-ld fallback"
+            if structured:
+                same = comparable(kind, records) == comparable(kind, baseline_records)
+            else:
+                same = [asdict(record) for record in records] == [asdict(record) for record in baseline_records]
+            totals[(kind, mode)]["seconds"].append(median_time)
+            totals[(kind, mode)]["records"] += len(records)
+            print(
+                f"{name:<40} {mode:<20} {median_time * 1000:8.2f} ms  p95 {stats['p95'] * 1000:8.2f} ms "
+                f"{stats['per_record'] * 1e6:8.1f} us/record {stats['records_per_second']:9.0f} records/s "
+                f"{memory / 1024:8.0f} KiB peak {len(records):4d} records  "
+                f"x{baseline_time / median_time:5.2f} time  {1 - memory / baseline_memory:5.0%} memory saved  "
+                f"{'same fields' if same else 'FIELDS DIFFER'}"
+            )
+
+        # Per-page cost of sniffing the charset and decoding a full copy before parsing
+        text_time, text_records = time_call(extract_from_text, kind, html, rounds=ROUNDS)
+        bytes_time, bytes_records = time_call(extract_from_bytes, kind, html, rounds=ROUNDS)
+        text_memory = peak_memory_of(extract_from_text, kind, html)
+        bytes_memory = peak_memory_of(extract_from_bytes, kind, html)
+        same = [asdict(record) for record in bytes_records] == [asdict(record) for record in text_records]
+        for mode, median_time, memory in (("sniffed text", text_time, text_memory), ("bytes", bytes_time, bytes_memory)):
+            print(
+                f"{name:<40} {mode:<20} {median_time * 1000:8.2f} ms "
+                f"{memory / 1024:8.0f} KiB peak  x{text_time / median_time:5.2f} time  {1 - memory / text_memory:5.0%} memory saved  "
+                f"{'same fields' if same else 'FIELDS DIFFER'}"
+            )
+
+        if kind == "search" and scraper.lxml is not None:
+            # A full parse has its first record only once the whole page is parsed
+            stream_time, (stream_records, first_record, bytes_read) = time_call(stream_search, html, rounds=ROUNDS)
+            stream_memory = peak_memory_of(stream_search, html)
+            same = [asdict(record) for record in stream_records] == [asdict(record) for record in bytes_records]
+            print(
+                f"{name:<40} {'stream':<20} {stream_time * 1000:8.2f} ms "
+                f"{stream_memory / 1024:8.0f} KiB peak  x{bytes_time / stream_time:5.2f} time  {1 - stream_memory / bytes_memory:5.0%} memory saved  "
+                f"first record {first_record * 1000:.2f} ms  read {bytes_read / len(html):.0%} of the page  "
+                f"{'same fields' if same else 'FIELDS DIFFER'}"
+            )
+
+        if kind == "listing":
+            soup = scraper.make_soup(html)
+            legacy_time, legacy_reviews = time_extraction(legacy_review_extraction, soup, rounds=ROUNDS)
+            single_time, single_reviews = time_extraction(single_pass_review_extraction, soup, rounds=ROUNDS)
+            # The legacy extractor stops at four reviews; the single pass must agree on those
+            same = single_reviews[:len(legacy_reviews)] == legacy_reviews
+            for mode, median_time, reviews in (("legacy extract", legacy_time, legacy_reviews), ("single-pass extract", single_time, single_reviews)):
+                print(
+                    f"{name:<40} {mode:<20} {median_time * 1000:8.2f} ms "
+                    f"{len(reviews):4d} records {median_time / max(len(reviews), 1) * 1e6:7.1f} us/record  x{legacy_time / median_time:5.2f} time  "
+                    f"{'same fields' if same else 'FIELDS DIFFER'}"
+                )
+
+    ## Corpus-wide figures to compare between runs: per-page median/p95 and overall throughput
+    print()
+    for (kind, mode), total in sorted(totals.items()):
+        seconds = total["seconds"]
+        print(
+            f"{kind:<8} {mode:<20} {len(seconds):3d} pages  median {statistics.median(seconds) * 1000:8.2f} ms/page  "
+            f"p95 {scraper.percentile(seconds, 95) * 1000:8.2f} ms/page  {total['records'] / sum(seconds):9.0f} records/s"
+        )
+
+    ## Record types: construction cost and retained memory, projected to a million-record crawl
+    print()
+    for kind, legacy_type, record_type in (("search", LegacySearchData, scraper.SearchData), ("listing", LegacyReviewData, scraper.ReviewData)):
+        legacy_seconds, legacy_bytes = record_footprint(legacy_type, SAMPLE_RECORDS[kind], RECORD_COUNT)
+        for label, record_seconds, record_bytes in (
+            (legacy_type.__name__, legacy_seconds, legacy_bytes),
+            (f"{record_type.__name__} (slots)", *record_footprint(record_type, SAMPLE_RECORDS[kind], RECORD_COUNT)),
+        ):
+            print(
+                f"{label:<24} {record_seconds * 1e6:6.2f} us/record  {record_bytes:6.0f} bytes/record  "
+                f"{record_bytes * 1e6 / 2 ** 20:7.0f} MiB per million  x{legacy_seconds / record_seconds:5.2f} time  "
+                f"{1 - record_bytes / legacy_bytes:5.0%} memory saved"
+            )
@@ -4,6 +4,7 @@ import requests
 import json
 import logging
 from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import concurrent.futures
 from dataclasses import dataclass, field, fields, asdict
@@ -32,6 +33,16 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def make_session(max_threads=5):
+    # One keep-alive connection pool for the whole run, sized to the worker threads, so each page
+    # reuses a connection to the proxy instead of paying a new TCP+TLS handshake
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_threads)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 
 @dataclass
 class SearchData:
@@ -111,7 +122,7 @@ class DataPipeline:
 
 
 
-def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3):
+def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3, session=None):
     formatted_keyword = keyword.replace(" ", "+")
     url = f"https://www.etsy.com/search?q={formatted_keyword}&ref=pagination&page={page_number+1}"
     tries = 0
@@ -120,7 +131,7 @@ def scrape_search_results(keyword, location, page_number, data_pipeline=None, re
     while tries <= retries and not success:
         try:
             scrapeops_proxy_url = get_scrapeops_url(url, location=location)
-            response = requests.get(scrapeops_proxy_url)
+            response = (session or requests).get(scrapeops_proxy_url, timeout=(10, 120))
             logger.info(f"Recieved [{response.status_code}] from: {url}")
             if response.status_code != 200:
                 raise Exception(f"Failed request, Status Code {response.status_code}")
@@ -187,7 +198,7 @@ def scrape_search_results(keyword, location, page_number, data_pipeline=None, re
 
 
 
-def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3):
+def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3, session=None):
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
         executor.map(
             scrape_search_results,
@@ -195,18 +206,19 @@ def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, re
             [location] * pages,
             range(pages),
             [data_pipeline] * pages,
-            [retries] * pages
+            [retries] * pages,
+            [session] * pages
         )
 
 
-def process_item(row, location, retries=3):
+def process_item(row, location, retries=3, session=None):
     url = row["url"]
     tries = 0
     success = False
 
     while tries <= retries and not success:
-        response = requests.get(url)
         try:
+            response = (session or requests).get(url, timeout=(10, 120))
             if response.status_code == 200:
                 logger.info(f"Status: {response.status_code}")
 
@@ -255,13 +267,13 @@ def process_item(row, location, retries=3):
 
 
 
-def process_results(csv_file, location, retries=3):
+def process_results(csv_file, location, retries=3, session=None):
     logger.info(f"processing {csv_file}")
     with open(csv_file, newline="") as file:
         reader = list(csv.DictReader(file))
 
         for row in reader:
-            process_item(row, location, retries=retries)
+            process_item(row, location, retries=retries, session=session)
 
         
 if __name__ == "__main__":
@@ -277,15 +289,20 @@ if __name__ == "__main__":
     keyword_list = ["coffee mug"]
     aggregate_files = []
 
+    ## Shared keep-alive connection pool for every fetch in the run
+    session = make_session(MAX_THREADS)
+
     ## Job Processes
     for keyword in keyword_list:
         filename = keyword.replace(" ", "-")
 
         crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv")
-        start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=MAX_THREADS, retries=MAX_RETRIES)
+        start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=MAX_THREADS, retries=MAX_RETRIES, session=session)
         crawl_pipeline.close_pipeline()
         aggregate_files.append(f"{filename}.csv")
     logger.info(f"Crawl complete.")
 
     for file in aggregate_files:
-        process_results(file, LOCATION, retries=MAX_RETRIES)
\ No newline at end of file
+        process_results(file, LOCATION, retries=MAX_RETRIES, session=session)
+
+    session.close()
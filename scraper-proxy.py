@@ -2,29 +2,82 @@ import os
 import csv
 import requests
 import json
+import time
 import logging
-from urllib.parse import urlencode
-from bs4 import BeautifulSoup
+import random
+import threading
+import asyncio
+import contextvars
+import functools
+import itertools
+import email.utils
+import hashlib
+import sqlite3
+import re
+import math
+import collections
+import multiprocessing
+import operator
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlparse, urlunparse, parse_qsl
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from bs4 import BeautifulSoup, SoupStrainer, Tag
 import concurrent.futures
-from dataclasses import dataclass, field, fields, asdict
+from dataclasses import dataclass, fields
+from decimal import Decimal, InvalidOperation
 
-API_KEY = ""
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
-with open("config.json", "r") as config_file:
-    config = json.load(config_file)
-    API_KEY = config["api_key"]
+try:
+    import lxml.etree
+except ImportError:
+    lxml = None
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
+API_KEY = ""
+SCRAPEOPS_ENDPOINT = "https://proxy.scrapeops.io/v1/"
 
-def get_scrapeops_url(url, location="us"):
-    payload = {
-        "api_key": API_KEY,
-        "url": url,
-        "bypass": "generic_level_4",
-        "country": location
-        }
-    proxy_url = "https://proxy.scrapeops.io/v1/?" + urlencode(payload)
-    return proxy_url
+## BeautifulSoup tree builder: "lxml" builds the tree faster than the stdlib "html.parser" and
+## extracts the same fields (compare with parser-benchmark.py); falls back when lxml is missing
+HTML_PARSER = "lxml" if lxml is not None else "html.parser"
+## Only build the subtrees the extractors read (listing cards, review cards); a page where the
+## strained parse finds nothing is parsed again in full
+PARTIAL_PARSE = True
+## Read reviews from the listing page's schema.org JSON-LD before touching the DOM; pages without
+## a usable block go through the BeautifulSoup extractors. Values are rewritten to the DOM's formats
+STRUCTURED_DATA = True
+## Same fast path for search pages. Off by default: the ItemList only carries the offer price, so
+## original_price would equal current_price and sale prices would be lost
+STRUCTURED_SEARCH = False
+## Parse search pages with lxml's incremental parser while they download and drop the connection
+## once the pagination nav after the listing grid has been read. Streamed pages skip hedging and the parse
+## pool, and are only cached when they were read to the end
+STREAM_SEARCH = lxml is not None
+## Listing ids become int, review ratings int or float and prices Decimal as each page is parsed. The decimal
+## separator of a price is inferred per value ("1,234.56", "1.234,56", "12,50"); set "," or "."
+## to force it for a locale where that is ambiguous
+COERCE_TYPES = True
+PRICE_DECIMAL_SEPARATOR = None
+## DataPipeline buffers records column by column and hands whole columns to its sinks instead of
+## building one dict per row. "parquet" also writes each batch with pyarrow next to the CSV (the
+## CSV stays, the review crawl reads it back); row-by-row CSV is kept for COLUMNAR_BATCHES = False
+COLUMNAR_BATCHES = True
+RECORD_FORMATS = ("csv",)
+
+config = {}
+if os.path.isfile("config.json"):
+    with open("config.json", "r") as config_file:
+        config = json.load(config_file)
+        API_KEY = config.get("api_key", "")
 
 
 ## Logging
@@ -33,74 +86,1432 @@ logger = logging.getLogger(__name__)
 
 
 
-@dataclass
+## Timeouts and deadlines
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+
+    def __init__(self, seconds=None):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self):
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("Run deadline exceeded")
+
+    def clamp(self, timeout):
+        # Never let a single request outlive the run
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return tuple(min(value, remaining) for value in timeout)
+
+    def iter_chunks(self, chunks):
+        # requests applies the read timeout to each socket read rather than the whole body,
+        # so a slowly trickling body is cut off here between chunks
+        for chunk in chunks:
+            self.check()
+            yield chunk
+
+    def sleep(self, seconds):
+        remaining = self.remaining()
+        time.sleep(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+    async def sleep_async(self, seconds):
+        remaining = self.remaining()
+        await asyncio.sleep(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+
+
+def is_overloaded(status_code):
+    # No response at all, throttling, or a server-side failure
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+
+## Adaptive concurrency
+class AdaptiveConcurrency:
+
+    def __init__(self, initial_limit=5, min_limit=1, max_limit=50, latency_target=10.0,
+                 window_size=20, backoff_factor=0.5):
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.window_size = window_size
+        self.backoff_factor = backoff_factor
+        self.latencies = []
+        self.samples_since_change = 0
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, status_code=None, latency=None):
+        with self.condition:
+            self.in_flight -= 1
+            self.record(status_code, latency)
+            self.condition.notify_all()
+
+    def release_unused(self):
+        # A slot handed back before its request went out gives the controller no sample
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record(self, status_code=None, latency=None):
+        # Callers hold self.condition (threads) or run on the event loop (asyncio)
+        self.samples_since_change += 1
+        if is_overloaded(status_code):
+            # Only back off once per round of in-flight requests, otherwise one burst
+            # of errors would collapse the limit straight to the floor
+            if self.samples_since_change >= self.limit:
+                reason = "network error" if status_code is None else f"status {status_code}"
+                self.set_limit(int(self.limit * self.backoff_factor), reason)
+            return
+
+        if latency is not None:
+            self.latencies.append(latency)
+        if len(self.latencies) < self.window_size:
+            return
+        p95 = percentile(self.latencies, 95)
+        self.latencies.clear()
+        if p95 > self.latency_target:
+            self.set_limit(int(self.limit * self.backoff_factor), f"p95 latency {p95:.2f}s")
+        else:
+            self.set_limit(self.limit + 1, f"p95 latency {p95:.2f}s")
+
+    def set_limit(self, new_limit, reason):
+        new_limit = max(self.min_limit, min(new_limit, self.max_limit))
+        if new_limit != self.limit:
+            logger.info(f"Concurrency limit {self.limit} -> {new_limit} ({reason})")
+            self.limit = new_limit
+        self.samples_since_change = 0
+
+
+
+## Retries
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+
+    def __init__(self, base_delay=1.0, max_delay=30.0, max_retry_after=60.0, retry_budget=100):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_budget = retry_budget
+        self.retries_spent = 0
+        self.budget_exhausted_logged = False
+        self.lock = threading.Lock()
+
+    def is_retryable(self, status_code):
+        # None means the request never produced a response (network error). Parse failures
+        # never get here: they are re-parsed from the bytes in hand (see parse_page)
+        return is_overloaded(status_code)
+
+    def backoff_delay(self, attempt):
+        # Full jitter: spreads retries from many workers instead of synchronising them
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, attempt, status_code=None, headers=None):
+        if not self.is_retryable(status_code):
+            logger.warning(f"Status {status_code} is not retryable, giving up")
+            return None
+        with self.lock:
+            if self.retries_spent >= self.retry_budget:
+                if not self.budget_exhausted_logged:
+                    logger.error(f"Retry budget of {self.retry_budget} spent, no further retries this run")
+                    self.budget_exhausted_logged = True
+                return None
+            self.retries_spent += 1
+
+        delay = self.backoff_delay(attempt)
+        retry_after = parse_retry_after(headers.get("Retry-After")) if headers else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+
+## Rate limiting
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token now, possibly going into debt, and returns how long the caller
+        # must wait before using it. Never blocks, so it is safe on the event loop too.
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+
+    def __init__(self, default_host_rate=None, host_rates=None, key_rates=None, default_key_rate=None):
+        self.default_host_rate = default_host_rate
+        self.host_rates = host_rates or {}
+        self.default_key_rate = default_key_rate
+        self.key_rates = key_rates or {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get_bucket(self, scope, name, rate):
+        with self.lock:
+            bucket = self.buckets.get((scope, name))
+            if bucket is None:
+                bucket = TokenBucket(rate)
+                self.buckets[(scope, name)] = bucket
+            return bucket
+
+    def reserve(self, url, api_key=None):
+        delays = [0.0]
+        host = urlparse(url).netloc
+        host_rate = self.host_rates.get(host, self.default_host_rate)
+        if host_rate:
+            delays.append(self.get_bucket("host", host, host_rate).reserve())
+        key_rate = self.key_rates.get(api_key, self.default_key_rate)
+        if key_rate:
+            delays.append(self.get_bucket("key", api_key, key_rate).reserve())
+        return max(delays)
+
+    def acquire(self, url, api_key=None):
+        delay = self.reserve(url, api_key)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url, api_key=None):
+        delay = self.reserve(url, api_key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+
+## Response cache
+TRACKING_PARAMS = {"ref", "sr_prefetch", "pf_from", "frs", "sts", "organic_search_click", "pro", "click_key", "click_sum", "ls", "content_source"}
+
+
+def normalize_url(url):
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if path.startswith("/listing/"):
+        # A listing is identified by its path; the query only carries search tracking
+        query = ""
+    else:
+        params = [(key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                  if key not in TRACKING_PARAMS and not key.startswith("utm_")]
+        query = urlencode(sorted(params))
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path, "", query, ""))
+
+
+class ResponseCache:
+
+    def __init__(self, cache_dir=".http_cache", max_bytes=500 * 1024 * 1024, search_ttl=3600,
+                 listing_ttl=7 * 24 * 3600, default_ttl=24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.search_ttl = search_ttl
+        self.listing_ttl = listing_ttl
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self.entries())
+
+    def ttl_for(self, url):
+        path = urlparse(url).path
+        if path.startswith("/search"):
+            return self.search_ttl
+        if path.startswith("/listing/"):
+            return self.listing_ttl
+        return self.default_ttl
+
+    def key_for(self, url, location):
+        return hashlib.sha256(f"{location}|{normalize_url(url)}".encode("utf-8")).hexdigest()
+
+    def paths_for(self, key):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.html", f"{base}.json"
+
+    def entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if filename.endswith(".html"):
+                    path = os.path.join(root, filename)
+                    stat = os.stat(path)
+                    yield path, stat.st_mtime, stat.st_size
+
+    def get(self, url, location="us"):
+        body_path, meta_path = self.paths_for(self.key_for(url, location))
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            if time.time() - meta["fetched_at"] > self.ttl_for(url):
+                self.record(hit=False)
+                return None
+            with open(body_path, "rb") as body_file:
+                body = body_file.read()
+            # mtime doubles as the LRU clock
+            os.utime(body_path)
+        except (OSError, ValueError, KeyError):
+            self.record(hit=False)
+            return None
+        self.record(hit=True)
+        return body, meta["headers"]
+
+    def set(self, url, body, headers, location="us"):
+        body_path, meta_path = self.paths_for(self.key_for(url, location))
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        previous_size = os.path.getsize(body_path) if os.path.isfile(body_path) else 0
+        meta = {
+            "url": normalize_url(url),
+            "fetched_at": time.time(),
+            "headers": {"Content-Type": headers.get("Content-Type", "")}
+        }
+        for path, mode, data in ((body_path, "wb", body), (meta_path, "w", json.dumps(meta))):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes += len(body) - previous_size
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        with self.lock:
+            for body_path, _, size in sorted(self.entries(), key=lambda entry: entry[1]):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                for path in (body_path, body_path[:-len(".html")] + ".json"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self.total_bytes -= size
+                self.evictions += 1
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"{stats['evictions']} evictions, {stats['bytes']} bytes on disk"
+        )
+
+
+def cached_response(url, body, headers):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    # The body is already in memory, so iter_content() slices it instead of reading a socket
+    response._content_consumed = True
+    return response
+
+
+
+## Request coalescing
+class SingleFlight:
+
+    def __init__(self):
+        self.calls = {}
+        self.async_calls = {}
+        self.lock = threading.Lock()
+        self.executed = 0
+        self.joined = 0
+        self.reused = 0
+
+    def claim(self, calls, key, new_future):
+        # Returns (future, owner). Failed calls are forgotten so a later caller can try again.
+        with self.lock:
+            future = calls.get(key)
+            if future is None:
+                future = new_future()
+                calls[key] = future
+                self.executed += 1
+                return future, True
+            if future.done():
+                self.reused += 1
+            else:
+                self.joined += 1
+            return future, False
+
+    def forget(self, calls, key):
+        with self.lock:
+            calls.pop(key, None)
+
+    def do(self, key, func, *args):
+        future, owner = self.claim(self.calls, key, concurrent.futures.Future)
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                self.forget(self.calls, key)
+                future.set_exception(e)
+        return future.result()
+
+    async def do_async(self, key, func, *args):
+        loop = asyncio.get_running_loop()
+        future, owner = self.claim(self.async_calls, key, loop.create_future)
+        if owner:
+            try:
+                future.set_result(await func(*args))
+            except Exception as e:
+                self.forget(self.async_calls, key)
+                future.set_exception(e)
+        return await asyncio.shield(future)
+
+    def log_stats(self):
+        logger.info(
+            f"Request coalescing: {self.executed} executed, {self.joined} joined an in-flight call, "
+            f"{self.reused} reused a finished result"
+        )
+
+
+
+## Proxy backends
+class ProxyBackend:
+
+    def __init__(self, name, api_key, endpoint=None, params=None, key_param="api_key", country_param="country",
+                 max_concurrency=None, weight=1.0, rate_limit=None, window_size=50):
+        self.name = name
+        self.api_key = api_key
+        self.endpoint = endpoint or SCRAPEOPS_ENDPOINT
+        self.params = {"bypass": "generic_level_4"} if params is None else params
+        self.key_param = key_param
+        self.country_param = country_param
+        # None leaves the cap to the engine (threads, AIMD limit, asyncio semaphore)
+        self.max_concurrency = max_concurrency
+        self.weight = weight
+        self.rate_limit = rate_limit
+        self.outcomes = collections.deque(maxlen=window_size)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_probe = 0.0
+        self.lock = threading.Lock()
+
+    def build_url(self, url, location="us"):
+        payload = {
+            self.key_param: self.api_key,
+            "url": url,
+            **self.params,
+            self.country_param: location
+            }
+        return f"{self.endpoint}?{urlencode(payload)}"
+
+    def has_slot(self):
+        return self.max_concurrency is None or self.in_flight < self.max_concurrency
+
+    def record(self, status_code, latency):
+        success = not is_overloaded(status_code)
+        with self.lock:
+            self.requests += 1
+            if not success:
+                self.failures += 1
+            self.outcomes.append((success, latency))
+
+    def success_rate(self):
+        with self.lock:
+            if not self.outcomes:
+                return 1.0
+            return sum(success for success, _ in self.outcomes) / len(self.outcomes)
+
+    def median_latency(self):
+        with self.lock:
+            return percentile([latency for success, latency in self.outcomes if success], 50)
+
+    def score(self):
+        # Errors hurt more than slowness: a backend at 50% success gets a quarter of the traffic
+        return self.weight * self.success_rate() ** 2 / (1.0 + self.median_latency())
+
+
+class ProxyPool:
+
+    def __init__(self, backends, min_success_rate=0.5, min_samples=10, probe_interval=30.0):
+        self.backends = backends
+        self.min_success_rate = min_success_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+        self.condition = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config):
+        entries = config.get("proxies")
+        if not entries:
+            return cls([ProxyBackend("scrapeops", config.get("api_key", API_KEY))])
+        return cls([ProxyBackend(**entry) for entry in entries])
+
+    def is_healthy(self, backend):
+        return len(backend.outcomes) < self.min_samples or backend.success_rate() >= self.min_success_rate
+
+    def pick(self, exclude=(), need_slot=True):
+        # Callers hold self.condition
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        healthy = [backend for backend in candidates if self.is_healthy(backend)]
+        now = time.monotonic()
+        # A degraded backend only gets an occasional probe so it can prove it has recovered;
+        # otherwise traffic waits for a healthy backend rather than spilling onto it
+        probes = [backend for backend in candidates
+                  if backend not in healthy and (backend.has_slot() or not need_slot)
+                  and now - backend.last_probe >= self.probe_interval]
+        if probes:
+            backend = probes[0]
+            backend.last_probe = now
+            return backend
+        available = [backend for backend in healthy or candidates if backend.has_slot() or not need_slot]
+        if not available:
+            return None
+        return random.choices(available, weights=[max(backend.score(), 1e-6) for backend in available])[0]
+
+    def choose(self, exclude=()):
+        # The backend for the next request, without taking a slot on it: callers wait for its
+        # rate-limit token first and reserve() it afterwards, so nobody holds a slot while asleep
+        with self.condition:
+            return self.pick(exclude) or self.pick(exclude, need_slot=False)
+
+    def try_reserve(self, backend):
+        with self.condition:
+            if not backend.has_slot():
+                return False
+            backend.in_flight += 1
+            return True
+
+    def reserve(self, backend):
+        with self.condition:
+            while not backend.has_slot():
+                self.condition.wait()
+            backend.in_flight += 1
+
+    def release(self, backend):
+        with self.condition:
+            backend.in_flight -= 1
+            self.condition.notify_all()
+
+    def can_fail_over(self, tried):
+        return any(backend not in tried for backend in self.backends)
+
+    def key_rates(self):
+        return {backend.api_key: backend.rate_limit for backend in self.backends if backend.rate_limit}
+
+    def log_stats(self):
+        for backend in self.backends:
+            logger.info(
+                f"Proxy {backend.name}: {backend.requests} requests, {backend.failures} failures, "
+                f"recent success {backend.success_rate():.0%}, median latency {backend.median_latency():.2f}s"
+            )
+
+
+
+## Hedged requests
+class Hedger:
+
+    def __init__(self, max_extra_ratio=0.1, hedge_percentile=95, min_samples=20, window_size=500, max_workers=10):
+        self.max_extra_ratio = max_extra_ratio
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.latencies = collections.deque(maxlen=window_size)
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            return percentile(self.latencies, self.hedge_percentile)
+
+    def reserve_hedge(self):
+        # Hedges may add at most max_extra_ratio extra requests on top of the primaries
+        with self.lock:
+            if self.hedges + 1 > self.max_extra_ratio * self.primaries:
+                return False
+            self.hedges += 1
+            return True
+
+    def timed(self, func, *args):
+        start = time.monotonic()
+        result = func(*args)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return result
+
+    def record_win(self, hedge_won):
+        if hedge_won:
+            with self.lock:
+                self.hedge_wins += 1
+
+    def run(self, func, *args):
+        with self.lock:
+            self.primaries += 1
+        delay = self.hedge_delay()
+        # Each attempt runs in a copy of the caller's context, so it still sees ON_REQUEST_SENT
+        primary = self.executor.submit(contextvars.copy_context().run, self.timed, func, *args)
+        if delay is None:
+            return primary.result()
+        done, _ = concurrent.futures.wait([primary], timeout=delay)
+        if done or not self.reserve_hedge():
+            return primary.result()
+
+        hedge = self.executor.submit(contextvars.copy_context().run, self.timed, func, *args)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                # A failed attempt only loses the race if the other one can still succeed
+                if future.exception() is None or not pending:
+                    self.record_win(future is hedge)
+                    return future.result()
+
+    async def run_async(self, func, *args):
+        with self.lock:
+            self.primaries += 1
+        delay = self.hedge_delay()
+        primary = asyncio.create_task(self.timed_async(func, *args))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self.reserve_hedge():
+            return await primary
+
+        hedge = asyncio.create_task(self.timed_async(func, *args))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        self.record_win(task is hedge)
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def timed_async(self, func, *args):
+        start = time.monotonic()
+        result = await func(*args)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+        return result
+
+    def log_stats(self):
+        win_rate = self.hedge_wins / self.hedges if self.hedges else 0.0
+        logger.info(
+            f"Hedging: {self.hedges} hedged of {self.primaries} requests, "
+            f"hedge finished first {self.hedge_wins} times ({win_rate:.0%})"
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+
+## Fetching
+## A search page sets a callback here that send_via calls right before the request goes out, after
+## any wait for a rate-limit token, a proxy slot or a concurrency slot. It raises SearchPageSkipped
+## for a page found to be past the last page during that wait, and otherwise marks the page sent
+ON_REQUEST_SENT = contextvars.ContextVar("on_request_sent", default=None)
+
+
+class SearchPageSkipped(Exception):
+    pass
+
+
+def request_starting():
+    on_request_sent = ON_REQUEST_SENT.get()
+    if on_request_sent is not None:
+        on_request_sent()
+
+
+class Fetcher:
+
+    def __init__(self, max_threads=5, pool_connections=10, concurrency=None, retry_policy=None, rate_limiter=None,
+                 cache=None, proxy_pool=None, hedger=None, timeout=(10, 120), deadline=None, parse_pool=None, quarantine=None):
+        # One adapter (and therefore one urllib3 pool per host) is shared by every
+        # per-thread session, so keep-alive connections survive across pages.
+        pool_maxsize = max_threads
+        if hedger is not None:
+            # Headroom so a hedge never queues behind the request it is racing
+            pool_maxsize += int(max_threads * hedger.max_extra_ratio) + 1
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True
+        )
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+        self.concurrency = concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.proxy_pool = proxy_pool or ProxyPool.from_config(config)
+        self.hedger = hedger
+        self.timeout = timeout
+        self.deadline = deadline or Deadline()
+        self.single_flight = SingleFlight()
+        self.parse_pool = parse_pool
+        self.quarantine = quarantine
+
+    def get_session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.local.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session
+
+    def get(self, url, location="us", refresh=False):
+        self.deadline.check()
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(url, location)
+            if cached is not None:
+                return cached_response(url, *cached)
+
+        response = self.send(url, location)
+        if self.cache is not None and response.status_code == 200:
+            self.cache.set(url, response.content, response.headers, location)
+        return response
+
+    def send(self, url, location="us"):
+        if self.hedger is not None:
+            return self.hedger.run(self.send_with_failover, url, location)
+        return self.send_with_failover(url, location)
+
+    def stream_search(self, url, location="us", refresh=False, on_records=None, chunk_size=16 * 1024):
+        self.deadline.check()
+        cached = None
+        if self.cache is not None and not refresh:
+            cached = self.cache.get(url, location)
+        if cached is not None:
+            response = cached_response(url, *cached)
+        else:
+            response = self.send_with_failover(url, location, stream=True)
+        stream_parser = None
+        try:
+            if response.status_code == 200:
+                stream_parser = SearchStreamParser(page_encoding(response.headers))
+                keep_body = self.cache is not None and cached is None
+                body = stream_parser.consume(self.deadline.iter_chunks(response.iter_content(chunk_size)), on_records, keep_body)
+                if body is not None:
+                    self.cache.set(url, body, response.headers, location)
+        except ParseError as e:
+            report_parse_failure(url, stream_parser.body, e, self.quarantine)
+            raise
+        finally:
+            response.close()
+        return response, stream_parser
+
+    def send_with_failover(self, url, location="us", stream=False):
+        tried = []
+        while True:
+            backend = self.proxy_pool.choose(exclude=tried)
+            tried.append(backend)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url, backend.api_key)
+            self.proxy_pool.reserve(backend)
+            try:
+                response = self.send_via(backend, url, location, stream)
+            except requests.RequestException as e:
+                if not self.proxy_pool.can_fail_over(tried):
+                    raise
+                logger.warning(f"Proxy {backend.name} failed ({e}), failing over")
+                continue
+            finally:
+                self.proxy_pool.release(backend)
+            if is_overloaded(response.status_code) and self.proxy_pool.can_fail_over(tried):
+                logger.warning(f"Proxy {backend.name} returned {response.status_code}, failing over")
+                response.close()
+                continue
+            return response
+
+    def send_via(self, backend, url, location="us", stream=False):
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        try:
+            request_starting()
+        except SearchPageSkipped:
+            if self.concurrency is not None:
+                self.concurrency.release_unused()
+            raise
+        status_code = None
+        start = time.monotonic()
+        try:
+            timeout = self.deadline.clamp(self.timeout)
+            response = self.get_session().get(backend.build_url(url, location), timeout=timeout, stream=True)
+            status_code = response.status_code
+            if not stream:
+                self.read_body(response)
+            return response
+        finally:
+            latency = time.monotonic() - start
+            backend.record(status_code, latency)
+            if self.concurrency is not None:
+                self.concurrency.release(status_code, latency)
+
+    def read_body(self, response, chunk_size=16 * 1024):
+        # Read the body up front as requests would, but give up once the run deadline passes
+        try:
+            response._content = b"".join(self.deadline.iter_chunks(response.iter_content(chunk_size)))
+        finally:
+            response.close()
+
+    def parse(self, kind, url, response):
+        # Hand the raw bytes to the parse processes when there are any, so the fetching
+        # threads never hold the GIL for a parse
+        try:
+            if self.parse_pool is not None:
+                return self.parse_pool.parse(kind, response.content, page_encoding(response.headers))
+            return parse_page(kind, response.content, page_encoding(response.headers))
+        except ParseError as e:
+            report_parse_failure(url, response.content, e, self.quarantine)
+            raise
+
+    def connection_stats(self):
+        requests_sent = 0
+        connections_opened = 0
+        pools = self.adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+        reused = max(requests_sent - connections_opened, 0)
+        return {
+            "sessions": len(self.sessions),
+            "requests": requests_sent,
+            "connections_opened": connections_opened,
+            "connections_reused": reused,
+            "reuse_rate": reused / requests_sent if requests_sent else 0.0
+        }
+
+    def log_stats(self):
+        stats = self.connection_stats()
+        logger.info(
+            f"Connection pool: {stats['requests']} requests over {stats['connections_opened']} connections "
+            f"({stats['connections_reused']} reused, {stats['reuse_rate']:.0%}) across {stats['sessions']} sessions"
+        )
+
+    def close(self):
+        if self.hedger is not None:
+            self.hedger.close()
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions.clear()
+        self.adapter.close()
+
+
+
+def record_metadata(cls):
+    # Worked out once per class; dataclasses.fields() reflection per record adds up over millions of records
+    cls.field_names = tuple(field.name for field in fields(cls))
+    cls.string_defaults = tuple((name, f"No {name}") for name in cls.field_names)
+    return cls
+
+
+@record_metadata
+@dataclass(slots=True)
 class SearchData:
     name: str = ""
     stars: float = 0
     url: str = ""
     price_currency: str = ""
     listing_id: int = 0
-    current_price: float = 0.0
-    original_price: float = 0.0
+    current_price: Decimal = Decimal("0")
+    original_price: Decimal = Decimal("0")
+    source: str = "dom"
 
 
     def __post_init__(self):
         self.check_string_fields()
         
     def check_string_fields(self):
-        for field in fields(self):
+        for name, empty_text in self.string_defaults:
+            value = getattr(self, name)
             # Check string fields
-            if isinstance(getattr(self, field.name), str):
+            if isinstance(value, str):
                 # If empty set default text
-                if getattr(self, field.name) == "":
-                    setattr(self, field.name, f"No {field.name}")
+                if value == "":
+                    setattr(self, name, empty_text)
                     continue
                 # Strip any trailing spaces, etc.
-                value = getattr(self, field.name)
-                setattr(self, field.name, value.strip())
+                stripped = value.strip()
+                if stripped != value:
+                    setattr(self, name, stripped)
 
-@dataclass
+@record_metadata
+@dataclass(slots=True)
 class ReviewData:
     name: str = ""
     date: str = ""
     review: str = ""
-    stars: int = 0
+    stars: float = 0
+    source: str = "dom"
 
 
     def __post_init__(self):
         self.check_string_fields()
         
     def check_string_fields(self):
-        for field in fields(self):
+        for name, empty_text in self.string_defaults:
+            value = getattr(self, name)
             # Check string fields
-            if isinstance(getattr(self, field.name), str):
+            if isinstance(value, str):
                 # If empty set default text
-                if getattr(self, field.name) == "":
-                    setattr(self, field.name, f"No {field.name}")
+                if value == "":
+                    setattr(self, name, empty_text)
                     continue
                 # Strip any trailing spaces, etc.
-                value = getattr(self, field.name)
-                setattr(self, field.name, value.strip())
+                stripped = value.strip()
+                if stripped != value:
+                    setattr(self, name, stripped)
+
+
+## Deduplication
+class SeenSet:
+
+    def __init__(self):
+        self.keys = set()
+        self.duplicates = 0
+
+    def check_and_add(self, key):
+        if key in self.keys:
+            self.duplicates += 1
+            return True
+        self.keys.add(key)
+        return False
+
+    def check_and_add_many(self, keys):
+        return [self.check_and_add(key) for key in keys]
+
+    def save(self, keys):
+        pass
+
+    def stats(self):
+        return {"keys": len(self.keys), "duplicates": self.duplicates}
+
+    def log_stats(self, label):
+        stats = self.stats()
+        logger.info(f"Dedup {label}: {stats['keys']} keys, {stats['duplicates']} duplicates dropped")
+
+
+class BloomFilter:
+    ## Fixed memory for crawls too big for a set: sized up front for `capacity` keys at `error_rate`
+    ## false positives. A false positive drops a new record as a duplicate; nothing is ever let
+    ## through twice
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+        self.duplicates = 0
+
+    def positions(self, key):
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def check_and_add(self, key):
+        present = True
+        for position in self.positions(key):
+            index, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[index] & mask:
+                self.bits[index] |= mask
+                present = False
+        if present:
+            self.duplicates += 1
+        else:
+            self.count += 1
+        return present
+
+    def check_and_add_many(self, keys):
+        return [self.check_and_add(key) for key in keys]
+
+    def save(self, keys):
+        pass
+
+    def false_positive_rate(self):
+        # Expected rate at the current fill, which passes error_rate once count exceeds capacity
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+    def stats(self):
+        return {
+            "keys": self.count,
+            "duplicates": self.duplicates,
+            "capacity": self.capacity,
+            "bytes": len(self.bits),
+            "hash_count": self.hash_count,
+            "false_positive_rate": self.false_positive_rate()
+        }
+
+    def log_stats(self, label):
+        stats = self.stats()
+        logger.info(
+            f"Dedup {label}: {stats['keys']} keys, {stats['duplicates']} duplicates dropped, Bloom filter "
+            f"{stats['bytes']} bytes, {stats['hash_count']} hashes, expected false positives {stats['false_positive_rate']:.4%}"
+        )
+        if self.count > self.capacity:
+            logger.warning(f"Dedup {label}: {self.count} keys exceed the Bloom filter capacity of {self.capacity}")
+
+
+class SeenStore:
+    ## Keys saved by earlier runs, one SQLite table shared by every keyword (each is a namespace).
+    ## A key is written only after its record has reached the sinks, and last_seen is refreshed
+    ## whenever a later run finds it again so compact() can drop listings that have disappeared.
+    ## A second table tracks review fetching per listing id across all keywords (see PersistentReviewQueue)
+
+    def __init__(self, path, lookup_batch_size=500):
+        self.path = path
+        self.lookup_batch_size = lookup_batch_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen (namespace TEXT NOT NULL, key TEXT NOT NULL, first_seen REAL NOT NULL, "
+            "last_seen REAL NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS reviews (listing_id TEXT NOT NULL PRIMARY KEY, url TEXT NOT NULL, name TEXT NOT NULL, "
+            "first_seen REAL NOT NULL, last_seen REAL NOT NULL, reviewed_at REAL) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    def index(self, namespace):
+        return PersistentSeenIndex(self, namespace)
+
+    def review_queue(self):
+        return PersistentReviewQueue(self)
+
+    def lookup(self, namespace, keys, seen_at):
+        # Stored keys among `keys`, refreshing their last_seen; one query per lookup_batch_size keys
+        found = set()
+        with self.lock:
+            for start in range(0, len(keys), self.lookup_batch_size):
+                batch = keys[start:start + self.lookup_batch_size]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute(
+                    f"SELECT key FROM seen WHERE namespace = ? AND key IN ({placeholders})", (namespace, *batch)
+                ).fetchall()
+                found.update(row[0] for row in rows)
+            if found:
+                self.connection.executemany(
+                    "UPDATE seen SET last_seen = ? WHERE namespace = ? AND key = ?", [(seen_at, namespace, key) for key in found]
+                )
+                self.connection.commit()
+        return found
+
+    def save(self, namespace, keys, seen_at):
+        with self.lock:
+            self.connection.executemany(
+                "INSERT INTO seen (namespace, key, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET last_seen = excluded.last_seen",
+                [(namespace, key, seen_at, seen_at) for key in keys]
+            )
+            self.connection.commit()
+
+    def compact(self, max_age):
+        # Forget keys no run has seen for max_age seconds, then give the space back to the filesystem
+        with self.lock:
+            cutoff = time.time() - max_age
+            deleted = self.connection.execute("DELETE FROM seen WHERE last_seen < ?", (cutoff,)).rowcount
+            self.connection.execute("DELETE FROM reviews WHERE last_seen < ?", (cutoff,))
+            self.connection.commit()
+            if deleted:
+                self.connection.execute("VACUUM")
+            remaining = self.connection.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+        logger.info(f"Dedup index {self.path}: compacted {deleted} keys older than {max_age}s, {remaining} kept")
+        return deleted
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class PersistentSeenIndex:
+
+    def __init__(self, store, namespace):
+        self.store = store
+        self.namespace = namespace
+        self.run_started = time.time()
+        # Accepted this run but not yet written by the sinks
+        self.pending = set()
+        self.saved_keys = set()
+        self.duplicates = 0
+        self.known = 0
+        self.saved = 0
+
+    def check_and_add(self, key):
+        return self.check_and_add_many([key])[0]
+
+    def check_and_add_many(self, keys):
+        index_keys = [index_key(key) for key in keys]
+        lookups = list({key for key in index_keys if key not in self.pending and key not in self.saved_keys})
+        stored = self.store.lookup(self.namespace, lookups, time.time()) if lookups else set()
+        results = []
+        for key in index_keys:
+            if key in self.pending or key in self.saved_keys:
+                self.duplicates += 1
+                results.append(True)
+            elif key in stored:
+                self.known += 1
+                results.append(True)
+            else:
+                self.pending.add(key)
+                results.append(False)
+        return results
+
+    def save(self, keys):
+        index_keys = [index_key(key) for key in keys if key is not None]
+        if not index_keys:
+            return
+        self.store.save(self.namespace, index_keys, time.time())
+        # saved_keys first: add_batch checks both sets without the flush lock
+        self.saved_keys.update(index_keys)
+        self.pending.difference_update(index_keys)
+        self.saved += len(index_keys)
+
+    def stats(self):
+        return {"saved": self.saved, "known": self.known, "duplicates": self.duplicates}
+
+    def log_stats(self, label):
+        stats = self.stats()
+        logger.info(
+            f"Dedup {label}: {stats['saved']} new keys saved to {self.store.path}, {stats['known']} already saved "
+            f"by an earlier run, {stats['duplicates']} duplicates dropped"
+        )
+
+
+def index_key(key):
+    if isinstance(key, tuple):
+        return "\x1f".join(str(part) for part in key)
+    return str(key)
+
+
+def seen_index(bloom_capacity=0, error_rate=0.001, store=None, namespace=""):
+    # The persistent index when a store is given, else an exact set unless a Bloom filter capacity is given
+    if store is not None:
+        return store.index(namespace)
+    if bloom_capacity:
+        return BloomFilter(bloom_capacity, error_rate)
+    return SeenSet()
+
+
+## Review queue
+class ReviewQueue:
+    ## Listings whose reviews still have to be fetched, keyed on listing id across every keyword.
+    ## It is a sink of each keyword's crawl pipeline, so a listing is queued as its row is written,
+    ## and the review stage marks it done once its reviews are saved. This one lasts for the run
+
+    def __init__(self):
+        self.listings = {}
+        self.reviewed = set()
+        self.lock = threading.Lock()
+        self.queued = 0
+
+    def write_columns(self, record_type, columns):
+        with self.lock:
+            for listing_id, name, url in zip(columns["listing_id"], columns["name"], columns["url"]):
+                listing_id = str(listing_id)
+                if listing_id in self.listings or listing_id in self.reviewed:
+                    continue
+                self.listings[listing_id] = {"listing_id": listing_id, "name": name, "url": url}
+                self.queued += 1
+
+    def close(self):
+        pass
+
+    def pending(self):
+        with self.lock:
+            return list(self.listings.values())
+
+    def mark_reviewed(self, listing_id):
+        with self.lock:
+            self.listings.pop(str(listing_id), None)
+            self.reviewed.add(str(listing_id))
+
+    def log_stats(self):
+        with self.lock:
+            logger.info(f"Review queue: {self.queued} listings queued, {len(self.reviewed)} reviewed, {len(self.listings)} left")
+
+
+class PersistentReviewQueue:
+    ## The same queue kept in the SeenStore: a listing saved by a run that failed, hit the deadline
+    ## or crashed before its reviews were in is picked up by the next run, and one reviewed under
+    ## another keyword is not fetched (or appended) again
+
+    def __init__(self, store):
+        self.store = store
+        self.reviewed = 0
+
+    def write_columns(self, record_type, columns):
+        seen_at = time.time()
+        rows = [(str(listing_id), url, name, seen_at, seen_at) for listing_id, name, url in zip(columns["listing_id"], columns["name"], columns["url"])]
+        # A listing already queued or reviewed (under any keyword) keeps its state
+        with self.store.lock:
+            self.store.connection.executemany(
+                "INSERT INTO reviews (listing_id, url, name, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (listing_id) DO UPDATE SET last_seen = excluded.last_seen",
+                rows
+            )
+            self.store.connection.commit()
+
+    def close(self):
+        pass
+
+    def pending(self):
+        with self.store.lock:
+            rows = self.store.connection.execute(
+                "SELECT listing_id, name, url FROM reviews WHERE reviewed_at IS NULL ORDER BY first_seen"
+            ).fetchall()
+        return [{"listing_id": listing_id, "name": name, "url": url} for listing_id, name, url in rows]
+
+    def mark_reviewed(self, listing_id):
+        with self.store.lock:
+            self.store.connection.execute("UPDATE reviews SET reviewed_at = ? WHERE listing_id = ?", (time.time(), str(listing_id)))
+            self.store.connection.commit()
+        self.reviewed += 1
+
+    def log_stats(self):
+        with self.store.lock:
+            left = self.store.connection.execute("SELECT COUNT(*) FROM reviews WHERE reviewed_at IS NULL").fetchone()[0]
+        logger.info(f"Review queue {self.store.path}: {self.reviewed} listings reviewed this run, {left} left for the next run")
+
+
+## Record batches and sinks
+class ColumnBatch:
+
+    def __init__(self):
+        self.record_type = None
+        self.columns = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, record):
+        if self.record_type is None:
+            self.record_type = type(record)
+            self.columns = {name: [] for name in self.record_type.field_names}
+            self.appenders = tuple(self.columns[name].append for name in self.record_type.field_names)
+            self.read_fields = operator.attrgetter(*self.record_type.field_names)
+        for append, value in zip(self.appenders, self.read_fields(record)):
+            append(value)
+        self.size += 1
+
+
+class CsvSink:
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def write_columns(self, record_type, columns):
+        field_names = record_type.field_names
+        file_exists = os.path.isfile(self.filename) and os.path.getsize(self.filename) > 0
+        with open(self.filename, mode="a", newline="", encoding="utf-8") as output_file:
+            writer = csv.writer(output_file)
+            if not file_exists:
+                writer.writerow(field_names)
+            writer.writerows(zip(*(columns[name] for name in field_names)))
+
+    def close(self):
+        pass
+
+
+def arrow_schema(record_type):
+    # Typed columns once values are coerced; with COERCE_TYPES off the fields coerce_records
+    # would convert still hold the page's text, the rest are already typed
+    arrow_types = {int: pyarrow.int64(), float: pyarrow.float64(), Decimal: pyarrow.decimal128(38, 6)}
+    text_fields = set() if COERCE_TYPES else {name for name, _ in COERCIONS[record_type]}
+    return pyarrow.schema([
+        (field.name, pyarrow.string() if field.name in text_fields else arrow_types.get(field.type, pyarrow.string()))
+        for field in fields(record_type)
+    ])
+
+
+## One lock per Parquet file: two pipelines writing the same file (same-named listings) take turns
+parquet_locks = collections.defaultdict(threading.Lock)
+parquet_locks_lock = threading.Lock()
+
+
+class ParquetSink:
+
+    def __init__(self, filename):
+        if pyarrow is None:
+            raise Exception("RECORD_FORMATS includes \"parquet\" but pyarrow is not installed")
+        self.filename = filename
+        self.partial_filename = f"{filename}.partial"
+        self.schema = None
+        self.writer = None
+        with parquet_locks_lock:
+            self.file_lock = parquet_locks[filename]
+
+    def write_columns(self, record_type, columns):
+        # One row group per batch. A Parquet file cannot be appended to, so the rows already in it
+        # are copied into a new file first, which replaces it on close: like the CSV beside it,
+        # the file keeps every run's and every pipeline's rows
+        if self.writer is None:
+            self.file_lock.acquire()
+        try:
+            if self.writer is None:
+                self.schema = arrow_schema(record_type)
+                self.writer = pyarrow.parquet.ParquetWriter(self.partial_filename, self.schema)
+                if os.path.isfile(self.filename):
+                    for batch in pyarrow.parquet.ParquetFile(self.filename).iter_batches():
+                        self.writer.write_batch(batch)
+            self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+        except Exception:
+            # Leave the existing file as it was and let other pipelines at it
+            self.discard()
+            raise
+
+    def discard(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            os.remove(self.partial_filename)
+        self.file_lock.release()
+
+    def close(self):
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            try:
+                writer.close()
+                os.replace(self.partial_filename, self.filename)
+            finally:
+                self.file_lock.release()
+
+
+def record_sinks(csv_filename):
+    sinks = []
+    if "csv" in RECORD_FORMATS:
+        sinks.append(CsvSink(csv_filename))
+    if "parquet" in RECORD_FORMATS:
+        sinks.append(ParquetSink(f"{os.path.splitext(csv_filename)[0]}.parquet"))
+    return sinks
 
 
 class DataPipeline:
     
-    def __init__(self, csv_filename="", storage_queue_limit=50):
-        self.names_seen = []
-        self.storage_queue = []
+    def __init__(self, csv_filename="", storage_queue_limit=50, columnar=None, dedup_key="name", seen=None, sinks=None):
+        # dedup_key is a field name or a tuple of them; records whose key is None are never dropped
+        self.key_fields = dedup_key if isinstance(dedup_key, tuple) else (dedup_key,)
+        self.read_key = operator.attrgetter(*self.key_fields)
+        self.seen = seen if seen is not None else SeenSet()
+        self.columnar = COLUMNAR_BATCHES if columnar is None else columnar
+        self.storage_queue = ColumnBatch() if self.columnar else []
         self.storage_queue_limit = storage_queue_limit
         self.csv_filename = csv_filename
-        self.csv_file_open = False
+        # Extra sinks (the review queue) get every written batch as columns, whichever way the CSV is written
+        self.sinks = (record_sinks(csv_filename) if self.columnar else []) + list(sinks or [])
+        self.saved_count = 0
+        # Search threads share a pipeline: the dedup check and a column batch append happen together
+        self.lock = threading.Lock()
+        # One flush at a time, so a sink never sees two writers (or two ParquetWriters) at once
+        self.flush_lock = threading.Lock()
     
-    def save_to_csv(self):
-        self.csv_file_open = True
-        data_to_save = []
-        data_to_save.extend(self.storage_queue)
-        self.storage_queue.clear()
+    def save_to_csv(self, blocking=True):
+        # A full queue seen while another thread is flushing is left for that thread's next flush
+        if not self.flush_lock.acquire(blocking=blocking):
+            return
+        try:
+            if self.columnar:
+                self.save_columns()
+            else:
+                self.save_rows()
+        finally:
+            self.flush_lock.release()
+
+    def save_rows(self):
+        with self.lock:
+            data_to_save = self.storage_queue
+            self.storage_queue = []
         if not data_to_save:
             return
 
-        keys = [field.name for field in fields(data_to_save[0])]
+        keys = list(data_to_save[0].field_names)
         file_exists = os.path.isfile(self.csv_filename) and os.path.getsize(self.csv_filename) > 0
         with open(self.csv_filename, mode="a", newline="", encoding="utf-8") as output_file:
             writer = csv.DictWriter(output_file, fieldnames=keys)
@@ -109,191 +1520,1453 @@ class DataPipeline:
                 writer.writeheader()
 
             for item in data_to_save:
-                writer.writerow(asdict(item))
+                writer.writerow({key: getattr(item, key) for key in keys})
 
-        self.csv_file_open = False
+        if self.sinks:
+            columns = {key: [getattr(item, key) for item in data_to_save] for key in keys}
+            for sink in self.sinks:
+                sink.write_columns(type(data_to_save[0]), columns)
+        self.saved_count += len(data_to_save)
+        self.seen.save([self.read_key(item) for item in data_to_save])
+
+    def save_columns(self):
+        with self.lock:
+            batch = self.storage_queue
+            self.storage_queue = ColumnBatch()
+        if not batch:
+            return
+        for sink in self.sinks:
+            sink.write_columns(batch.record_type, batch.columns)
+        self.saved_count += len(batch)
+        key_columns = [batch.columns[name] for name in self.key_fields]
+        self.seen.save(list(zip(*key_columns)) if len(key_columns) > 1 else key_columns[0])
                     
-    def is_duplicate(self, input_data):
-        if input_data.name in self.names_seen:
-            logger.warning(f"Duplicate item found: {input_data.name}. Item dropped.")
-            return True
-        self.names_seen.append(input_data.name)
-        return False
-            
     def add_data(self, scraped_data):
-        if self.is_duplicate(scraped_data) == False:
-            self.storage_queue.append(scraped_data)
-            if len(self.storage_queue) >= self.storage_queue_limit and self.csv_file_open == False:
-                self.save_to_csv()
+        self.add_batch([scraped_data])
+
+    def add_batch(self, records):
+        # One dedup lookup per page (or streamed batch) rather than per record
+        keys = [self.read_key(record) for record in records]
+        with self.lock:
+            duplicates = iter(self.seen.check_and_add_many([key for key in keys if key is not None]))
+            for record, key in zip(records, keys):
+                if key is not None and next(duplicates):
+                    logger.warning(f"Duplicate item found: {key}. Item dropped.")
+                    continue
+                self.storage_queue.append(record)
+        if len(self.storage_queue) >= self.storage_queue_limit:
+            self.save_to_csv(blocking=False)
                        
     def close_pipeline(self):
-        if self.csv_file_open:
-            time.sleep(3)
-        if len(self.storage_queue) > 0:
-            self.save_to_csv()
+        # Waits for a flush still running on another thread before writing the rest
+        self.save_to_csv()
+        with self.flush_lock:
+            for sink in self.sinks:
+                sink.close()
+
+
+## Typed fields
+PRICE_PATTERN = re.compile(r"[-+]?\d[\d.,'\s\u00a0\u202f]*")
+PRICE_GROUPING_PATTERN = re.compile(r"['\s\u00a0\u202f]")
+
+
+def infer_decimal_separator(number):
+    last_dot = number.rfind(".")
+    last_comma = number.rfind(",")
+    if last_dot >= 0 and last_comma >= 0:
+        return "." if last_dot > last_comma else ","
+    if last_dot < 0 and last_comma < 0:
+        return "."
+    separator = "." if last_dot >= 0 else ","
+    digits_after = len(number) - max(last_dot, last_comma) - 1
+    # A lone separator with three digits after it ("1,234", "1.234") groups thousands
+    if number.count(separator) == 1 and digits_after != 3:
+        return separator
+    return "," if separator == "." else "."
+
+
+def parse_price(text, decimal_separator=None):
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        raise ValueError(f"No price in {text!r}")
+    number = PRICE_GROUPING_PATTERN.sub("", match.group()).rstrip(".,")
+    decimal_separator = decimal_separator or infer_decimal_separator(number)
+    grouping_separator = "," if decimal_separator == "." else "."
+    return Decimal(number.replace(grouping_separator, "").replace(decimal_separator, "."))
+
+
+def price_value(value):
+    return parse_price(value, PRICE_DECIMAL_SEPARATOR)
+
+
+def rating_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+## (field, converter) per record type; only str values are converted, so running twice is harmless
+COERCIONS = {
+    SearchData: (("listing_id", int), ("current_price", price_value), ("original_price", price_value)),
+    ReviewData: (("stars", rating_value),),
+}
+
+
+def coerce_records(records):
+    # One pass over a page's records; a value that does not convert is stored as None and counted
+    if not COERCE_TYPES or not records:
+        return records
+    converters = COERCIONS[type(records[0])]
+    for record in records:
+        for name, convert in converters:
+            value = getattr(record, name)
+            if not isinstance(value, str):
+                continue
+            try:
+                setattr(record, name, convert(value))
+            except (ValueError, InvalidOperation):
+                setattr(record, name, None)
+                parse_stats.record_coercion_failure(type(record).__name__, name)
+    return records
+
+
+SEARCH_CARD_STRAINER = SoupStrainer("div", class_="wt-height-full")
+REVIEW_CARD_ID = re.compile(r"^review-text-width-(\d+)$")
+REVIEW_CARD_STRAINER = SoupStrainer("div", id=REVIEW_CARD_ID)
+REVIEWER_LINK_CLASS = "wt-text-link wt-mr-xs-1"
+## Byte patterns: pages are parsed straight from the response body without decoding it first
+PAGE_LINK_PATTERN = re.compile(rb'<a\b[^>]*\bdata-page="(\d+)"')
+JSON_LD_PATTERN = re.compile(
+    rb'<script\b[^>]*\btype=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+LISTING_ID_PATTERN = re.compile(r"/listing/(\d+)")
+CHARSET_PATTERN = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+
+def page_encoding(headers):
+    # Trust only an explicit charset. Etsy serves UTF-8, and requests would otherwise fall back
+    # to ISO-8859-1 for text/html or run charset detection over the whole body
+    content_type = headers.get("content-type") if headers else None
+    charset = CHARSET_PATTERN.search(content_type) if content_type else None
+    return charset.group(1) if charset else "utf-8"
+
+
+def as_bytes(markup):
+    return markup.encode("utf-8") if isinstance(markup, str) else markup
+
+
+def make_soup(html, parser=None, parse_only=None, encoding=None):
+    if isinstance(html, bytes):
+        # Bytes plus a known encoding go straight to the tree builder: no sniffing, no decoded copy
+        return BeautifulSoup(html, parser or HTML_PARSER, parse_only=parse_only, from_encoding=encoding or "utf-8")
+    return BeautifulSoup(html, parser or HTML_PARSER, parse_only=parse_only)
+
+
+class ParseStats:
+
+    def __init__(self):
+        self.parses = collections.Counter()
+        self.fallbacks = collections.Counter()
+        self.seconds = collections.Counter()
+        self.records = collections.Counter()
+        self.coercion_failures = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, kind, mode, seconds):
+        with self.lock:
+            self.parses[(kind, mode)] += 1
+            self.seconds[(kind, mode)] += seconds
+
+    def record_fallback(self, kind):
+        with self.lock:
+            self.fallbacks[kind] += 1
+
+    def record_source(self, kind, source, count):
+        with self.lock:
+            self.records[(kind, source)] += count
+
+    def record_coercion_failure(self, record_type, field_name):
+        with self.lock:
+            self.coercion_failures[(record_type, field_name)] += 1
+
+    def take(self):
+        # Hand over and reset the counts, so a parse process can report each page's share
+        with self.lock:
+            counts = (self.parses, self.fallbacks, self.seconds, self.records, self.coercion_failures)
+            self.parses, self.fallbacks, self.seconds = collections.Counter(), collections.Counter(), collections.Counter()
+            self.records, self.coercion_failures = collections.Counter(), collections.Counter()
+        return counts
+
+    def merge(self, counts):
+        parses, fallbacks, seconds, records, coercion_failures = counts
+        with self.lock:
+            self.parses.update(parses)
+            self.fallbacks.update(fallbacks)
+            self.seconds.update(seconds)
+            self.records.update(records)
+            self.coercion_failures.update(coercion_failures)
+
+    def log_stats(self):
+        for (kind, mode), count in sorted(self.parses.items()):
+            average = self.seconds[(kind, mode)] / count * 1000
+            logger.info(f"Parsed {count} {kind} pages ({mode}), {average:.1f} ms per page")
+        for kind, count in sorted(self.fallbacks.items()):
+            logger.info(f"{count} {kind} pages fell back from a partial to a full parse")
+        for (kind, source), count in sorted(self.records.items()):
+            logger.info(f"Extracted {count} {kind} records from {source}")
+        for (record_type, field_name), count in sorted(self.coercion_failures.items()):
+            logger.warning(f"{count} {record_type}.{field_name} values could not be converted and were left empty")
+
+
+parse_stats = ParseStats()
+
+
+def parse_cards(html, kind, find_cards, strainer, parser=None, partial=None, encoding=None):
+    partial = PARTIAL_PARSE if partial is None else partial
+    start = time.perf_counter()
+    if partial:
+        cards = find_cards(make_soup(html, parser, strainer, encoding))
+        if cards:
+            parse_stats.record(kind, "partial", time.perf_counter() - start)
+            return cards
+        # Nothing matched the strainer: a changed layout or a genuinely empty page
+        parse_stats.record_fallback(kind)
+    cards = find_cards(make_soup(html, parser, encoding=encoding))
+    parse_stats.record(kind, "full", time.perf_counter() - start)
+    return cards
+
+
+def json_ld_nodes(script):
+    try:
+        data = json.loads(script)
+    except ValueError:
+        logger.debug("Skipping malformed JSON-LD block")
+        return
+    blocks = data if isinstance(data, list) else [data]
+    for block in blocks:
+        if not isinstance(block, dict):
+            continue
+        yield block
+        for node in block.get("@graph", []):
+            if isinstance(node, dict):
+                yield node
+
+
+def iter_json_ld(html):
+    for match in JSON_LD_PATTERN.finditer(as_bytes(html)):
+        yield from json_ld_nodes(match.group(1))
+
+
+def json_ld_type(node):
+    node_type = node.get("@type", "")
+    return node_type if isinstance(node_type, list) else [node_type]
+
 
+## JSON-LD values in the formats the DOM shows them in, so a column reads the same whichever path ran
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "INR": "₹", "KRW": "₩"}
 
 
-def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3):
+def currency_symbol(code):
+    return CURRENCY_SYMBOLS.get(code, code)
+
+
+def review_date(iso_date):
+    # "2026-03-03" (or a full timestamp) as the review card prints it, "Mar 3, 2026"
+    try:
+        published = datetime.fromisoformat(iso_date)
+    except (TypeError, ValueError):
+        return iso_date
+    return f"{published:%b} {published.day}, {published.year}"
+
+
+def json_ld_value(value, key):
+    # schema.org allows either a nested object or a list of them
+    if isinstance(value, list):
+        value = value[0] if value else {}
+    if isinstance(value, dict):
+        return value.get(key)
+    return value
+
+
+def json_ld_search_results(html):
+    return search_results_from_json_ld(iter_json_ld(html))
+
+
+def search_results_from_json_ld(nodes):
+    for node in nodes:
+        if "ItemList" not in json_ld_type(node):
+            continue
+        search_results = []
+        for element in node.get("itemListElement", []):
+            if not isinstance(element, dict):
+                continue
+            product = element.get("item", element)
+            if not isinstance(product, dict) or "Product" not in json_ld_type(product):
+                continue
+            price = json_ld_value(product.get("offers"), "price")
+            if price is None:
+                price = json_ld_value(product.get("offers"), "lowPrice")
+            link = product.get("url", "")
+            listing_id = LISTING_ID_PATTERN.search(link)
+            if price is None or not listing_id:
+                continue
+            stars = json_ld_value(product.get("aggregateRating"), "ratingValue") or 0.0
+
+            search_data = SearchData(
+                name=product.get("name", ""),
+                stars=float(stars),
+                url=link,
+                price_currency=currency_symbol(json_ld_value(product.get("offers"), "priceCurrency") or "n/a"),
+                listing_id=listing_id.group(1),
+                current_price=str(price),
+                original_price=str(price),
+                source="json-ld"
+            )
+            search_results.append(search_data)
+        return search_results
+    return None
+
+
+def json_ld_reviews(html):
+    for node in iter_json_ld(html):
+        if "Product" not in json_ld_type(node) or "review" not in node:
+            continue
+        review_nodes = node["review"] if isinstance(node["review"], list) else [node["review"]]
+        reviews = []
+        for review_node in review_nodes:
+            if not isinstance(review_node, dict):
+                continue
+            date = review_node.get("datePublished", "")
+            if date == "":
+                continue
+            name = json_ld_value(review_node.get("author"), "name") or "n/a"
+
+            review_data = ReviewData(
+                name=name,
+                date=review_date(date),
+                review=review_node.get("reviewBody", ""),
+                # Text like the DOM's rating input, so both sources coerce to the same type
+                stars=str(json_ld_value(review_node.get("reviewRating"), "ratingValue") or 0),
+                source="json-ld"
+            )
+            reviews.append(review_data)
+        # An empty list or undated reviews say nothing about the page, so leave it to the DOM
+        if reviews:
+            return reviews
+    return None
+
+
+def parse_structured(html, kind, extract, structured=None):
+    structured = STRUCTURED_DATA if structured is None else structured
+    if not structured:
+        return None
+    start = time.perf_counter()
+    records = extract(html)
+    if records is None:
+        return None
+    parse_stats.record(kind, "json-ld", time.perf_counter() - start)
+    parse_stats.record_source(kind, "json-ld", len(records))
+    return records
+
+
+def search_url(keyword, page_number):
     formatted_keyword = keyword.replace(" ", "+")
-    url = f"https://www.etsy.com/search?q={formatted_keyword}&ref=pagination&page={page_number+1}"
+    return f"https://www.etsy.com/search?q={formatted_keyword}&ref=pagination&page={page_number+1}"
+
+
+def parse_last_page(html):
+    # Read straight from the markup so a partial parse does not need the pagination nav
+    page_numbers = [int(page) for page in PAGE_LINK_PATTERN.findall(as_bytes(html))]
+    if not page_numbers:
+        return None
+    return max(page_numbers)
+
+
+def find_search_cards(soup):
+    return soup.find_all("div", class_="wt-height-full")
+
+
+def parse_search_results(html, parser=None, partial=None, structured=None, encoding=None):
+    structured = STRUCTURED_SEARCH if structured is None else structured
+    search_results = parse_structured(html, "search", json_ld_search_results, structured)
+    if search_results is not None:
+        return search_results, parse_last_page(html)
+
+    div_cards = parse_cards(html, "search", find_search_cards, SEARCH_CARD_STRAINER, parser, partial, encoding)
+
+    search_results = []
+    last_listing = ""
+    for div_card in div_cards:
+        title = div_card.find("h3")
+        if not title:
+            continue
+        name = title.get("title")
+        a_tag = div_card.find("a")
+        listing_id = a_tag.get("data-listing-id")
+        if listing_id == last_listing:
+            continue
+        link = a_tag.get("href")
+        stars = 0.0
+        has_stars = div_card.find("span", class_="wt-text-title-small")
+        if has_stars:
+            stars = float(has_stars.text)
+        currency = "n/a"
+        currency_holder = div_card.find("span", class_="currency-symbol")
+        if currency_holder:
+            currency = currency_holder.text
+
+        prices = div_card.find_all("span", class_="currency-value")
+        if len(prices) < 1:
+            continue
+        current_price = prices[0].text
+        original_price = current_price
+        if len(prices) > 1:
+            original_price = prices[1].text
+
+        search_data = SearchData(
+            name=name,
+            stars=stars,
+            url=link,
+            price_currency=currency,
+            listing_id=listing_id,
+            current_price=current_price,
+            original_price=original_price
+        )
+        search_results.append(search_data)
+
+        last_listing = listing_id
+
+    parse_stats.record_source("search", "dom", len(search_results))
+    return search_results, parse_last_page(html)
+
+
+def has_class(element, class_name):
+    return class_name in (element.get("class") or "").split()
+
+
+def element_text(element):
+    return "".join(element.itertext())
+
+
+def first_descendant(element, tag, class_name=None):
+    for child in element.iter(tag):
+        if class_name is None or has_class(child, class_name):
+            return child
+    return None
+
+
+def inside_search_card(element):
+    return any(ancestor.tag == "div" and has_class(ancestor, "wt-height-full") for ancestor in element.iterancestors())
+
+
+def search_data_from_element(div_card):
+    # lxml twin of the card loop in parse_search_results
+    title = first_descendant(div_card, "h3")
+    if title is None:
+        return None
+    a_tag = first_descendant(div_card, "a")
+    stars = 0.0
+    has_stars = first_descendant(div_card, "span", "wt-text-title-small")
+    if has_stars is not None:
+        stars = float(element_text(has_stars))
+    currency = "n/a"
+    currency_holder = first_descendant(div_card, "span", "currency-symbol")
+    if currency_holder is not None:
+        currency = element_text(currency_holder)
+
+    prices = [element_text(span) for span in div_card.iter("span") if has_class(span, "currency-value")]
+    if len(prices) < 1:
+        return None
+    current_price = prices[0]
+    original_price = current_price
+    if len(prices) > 1:
+        original_price = prices[1]
+
+    return SearchData(
+        name=title.get("title"),
+        stars=stars,
+        url=a_tag.get("href"),
+        price_currency=currency,
+        listing_id=a_tag.get("data-listing-id"),
+        current_price=current_price,
+        original_price=original_price
+    )
+
+
+class SearchStreamParser:
+
+    def __init__(self, encoding="utf-8", structured=None):
+        self.encoding = encoding
+        self.parser = lxml.etree.HTMLPullParser(events=("end",), encoding=encoding)
+        self.structured = STRUCTURED_SEARCH if structured is None else structured
+        self.cards_seen = 0
+        self.last_listing = ""
+        self.page_numbers = []
+        self.pagination_tail = b""
+        self.result_count = 0
+        self.source = "dom"
+        self.done = False
+        self.read_to_end = False
+        # The pagination nav after the grid; the stream stops once it has closed
+        self.pagination = None
+        self.pagination_read = False
+        self.seconds = 0.0
+        # Set when extraction fails mid-stream; the page is then re-parsed whole from self.body
+        self.error = None
+        self.emitted = set()
+        self.body = None
+
+    @property
+    def last_page(self):
+        # Only trust the page links once the whole pagination nav is in: a list cut short would
+        # end the crawl too soon, so without it the empty-page check decides
+        if not (self.read_to_end or self.pagination_read) or not self.page_numbers:
+            return None
+        return max(self.page_numbers)
+
+    def feed(self, chunk):
+        start = time.perf_counter()
+        # Page links can straddle two chunks, so rescan the end of the previous one
+        window = self.pagination_tail + chunk
+        self.page_numbers.extend(int(page) for page in PAGE_LINK_PATTERN.findall(window))
+        self.pagination_tail = window[-256:]
+        self.parser.feed(chunk)
+        search_results = self.read_events()
+        self.seconds += time.perf_counter() - start
+        return search_results
+
+    def close(self):
+        start = time.perf_counter()
+        self.parser.close()
+        self.read_to_end = True
+        search_results = self.read_events()
+        self.seconds += time.perf_counter() - start
+        return search_results
+
+    def read_events(self):
+        search_results = []
+        for _, element in self.parser.read_events():
+            if self.done or not isinstance(element.tag, str):
+                continue
+            if element is self.pagination:
+                # Every page link has been fed by now, so last_page is known and the rest is skipped
+                self.pagination_read = True
+                self.done = True
+            elif element.tag == "script" and self.structured and self.source == "dom" and (element.get("type") or "").lower() == "application/ld+json":
+                structured_results = search_results_from_json_ld(json_ld_nodes(element.text or ""))
+                if structured_results is not None:
+                    # JSON-LD sits in the head: the whole page is covered before the grid starts,
+                    # which is then only read through to find the pagination nav
+                    search_results.extend(structured_results)
+                    self.source = "json-ld"
+            elif element.tag == "div" and has_class(element, "wt-height-full"):
+                # A card nested in one that is still open is read with the outer card, as find_all does
+                if self.pagination is not None or inside_search_card(element):
+                    continue
+                search_data = self.read_card(element)
+                if search_data is not None:
+                    search_results.append(search_data)
+            elif element.tag == "a" and element.get("data-page") is not None and self.cards_seen and self.pagination is None and not inside_search_card(element):
+                # The pagination nav follows the listing grid, however the grid is split into lists;
+                # a nav above the grid comes before any card and is passed over. Read on until it
+                # closes so the last page is known
+                self.pagination = next(element.iterancestors("nav"), None)
+                if self.pagination is None:
+                    self.done = True
+        self.result_count += len(search_results)
+        return search_results
+
+    def read_card(self, div_card):
+        self.cards_seen += 1
+        search_data = search_data_from_element(div_card) if self.source == "dom" else None
+        # The card's subtree has been read; free it so the tree never holds the whole grid
+        div_card.clear(keep_tail=True)
+        if search_data is None or search_data.listing_id == self.last_listing:
+            return None
+        self.last_listing = search_data.listing_id
+        return search_data
+
+    def finish(self):
+        parse_stats.record("search", "stream", self.seconds)
+        if self.error is None:
+            parse_stats.record_source("search", self.source, self.result_count)
+
+    def fail(self, error):
+        logger.warning(f"Streaming parse failed ({type(error).__name__}: {error}), parsing the whole page instead")
+        self.error = error
+
+    def feed_safely(self, chunk):
+        if self.error is not None:
+            return []
+        try:
+            return self.feed(chunk)
+        except Exception as e:
+            # Keep reading: the page is re-parsed once all of it is in
+            self.fail(e)
+            return []
+
+    def close_body(self, body):
+        if self.error is None:
+            try:
+                return self.close()
+            except Exception as e:
+                self.fail(e)
+        self.body = b"".join(body)
+        search_results, last_page = parse_page("search", self.body, self.encoding)
+        self.page_numbers = [last_page] if last_page is not None else []
+        self.read_to_end = True
+        self.result_count = len(search_results)
+        return [search_data for search_data in search_results if search_data.listing_id not in self.emitted]
+
+    def emit(self, search_results, on_records):
+        if not search_results:
+            return
+        for search_data in coerce_records(search_results):
+            self.emitted.add(search_data.listing_id)
+        on_records(search_results)
+
+    def take(self, chunk, on_records):
+        self.emit(self.feed_safely(chunk), on_records)
+
+    def take_rest(self, body, on_records):
+        self.emit(self.close_body(body), on_records)
+
+    def consume(self, chunks, on_records, keep_body=False):
+        # Returns the full body when keep_body is set and the page was read to the end. Chunks are
+        # held until the grid closes so a failed extraction can fall back to the whole page
+        body = []
+        try:
+            for chunk in chunks:
+                body.append(chunk)
+                self.take(chunk, on_records)
+                if self.done:
+                    return None
+            self.take_rest(body, on_records)
+        finally:
+            self.finish()
+        return b"".join(body) if keep_body and self.error is None else None
+
+    async def consume_async(self, chunks, on_records, run_blocking, keep_body=False):
+        # Same as consume() for aiohttp's async chunk iterator. Feeding lxml, the whole-page
+        # fallback and on_records go through run_blocking, which must always use the thread the
+        # parser was created on; the event loop only moves bytes
+        body = []
+        try:
+            async for chunk in chunks:
+                body.append(chunk)
+                await run_blocking(self.take, chunk, on_records)
+                if self.done:
+                    return None
+            await run_blocking(self.take_rest, body, on_records)
+        finally:
+            self.finish()
+        return b"".join(body) if keep_body and self.error is None else None
+
+
+class PaginationTracker:
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.last_index = None
+        self.skipped = 0
+        # Pages whose request has gone out; cancelling one of those saves nothing
+        self.sent = set()
+        self.lock = threading.Lock()
+
+    def observe(self, page_number, result_count, last_page=None):
+        # page_number is zero-based, last_page is the one-based number from the markup
+        candidates = []
+        if result_count == 0:
+            candidates.append(page_number - 1)
+        if last_page is not None:
+            candidates.append(last_page - 1)
+        if not candidates:
+            return
+        with self.lock:
+            last_index = min(candidates)
+            if self.last_index is None or last_index < self.last_index:
+                self.last_index = last_index
+                logger.info(f"Last search page is {last_index + 1} of {self.pages} requested")
+
+    def is_beyond(self, page_number):
+        return self.last_index is not None and page_number > self.last_index
+
+    def skip(self):
+        with self.lock:
+            self.skipped += 1
+
+    def start_request(self, page_number):
+        # The last check, made as the request goes out: a page that waited for a token or a slot
+        # while the last page was found is dropped here instead of being sent
+        with self.lock:
+            if self.last_index is not None and page_number > self.last_index:
+                raise SearchPageSkipped(f"Search page {page_number + 1} is past the last page")
+            self.sent.add(page_number)
+
+    def was_sent(self, page_number):
+        with self.lock:
+            return page_number in self.sent
+
+    def log_stats(self):
+        if self.skipped:
+            logger.info(f"Pagination: skipped {self.skipped} search page requests past the last page")
+
+
+def scrape_search_results(keyword, location, page_number, data_pipeline=None, retries=3, fetcher=None, pagination=None):
+    url = search_url(keyword, page_number)
     tries = 0
     success = False
+    result_count = 0
+    if pagination is not None:
+        # start_scrape runs each page in its own context, so no other page sees this
+        ON_REQUEST_SENT.set(functools.partial(pagination.start_request, page_number))
     
     while tries <= retries and not success:
+        if pagination is not None and pagination.is_beyond(page_number):
+            pagination.skip()
+            return 0
+        response = None
         try:
-            scrapeops_proxy_url = get_scrapeops_url(url, location=location)
-            response = requests.get(scrapeops_proxy_url)
+            stream_parser = None
+            if STREAM_SEARCH:
+                response, stream_parser = fetcher.stream_search(url, location=location, refresh=tries > 0, on_records=data_pipeline.add_batch)
+            else:
+                response = fetcher.get(url, location=location, refresh=tries > 0)
             logger.info(f"Recieved [{response.status_code}] from: {url}")
             if response.status_code != 200:
                 raise Exception(f"Failed request, Status Code {response.status_code}")
-                
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            div_cards = soup.find_all("div", class_="wt-height-full")
-
-            result_count = 0
-            last_listing = ""
-            for div_card in div_cards:
-                title = div_card.find("h3")
-                if not title:
-                    continue
-                name = title.get("title")
-                a_tag = div_card.find("a")
-                listing_id = a_tag.get("data-listing-id")
-                if listing_id == last_listing:
-                    continue
-                link = a_tag.get("href")
-                stars = 0.0
-                has_stars = div_card.find("span", class_="wt-text-title-small")
-                if has_stars:
-                    stars = float(has_stars.text)
-                currency = "n/a"
-                currency_holder = div_card.find("span", class_="currency-symbol")
-                if currency_holder:
-                    currency = currency_holder.text
-
-                prices = div_card.find_all("span", class_="currency-value")
-                if len(prices) < 1:
-                    continue
-                current_price = prices[0].text
-                original_price = current_price
-                if len(prices) > 1:
-                    original_price = prices[1].text
-
-                search_data = SearchData(
-                    name=name,
-                    stars=stars,
-                    url=link,
-                    price_currency=currency,
-                    listing_id=listing_id,
-                    current_price=current_price,
-                    original_price=original_price
-                )
-                data_pipeline.add_data(search_data)
-                
-                result_count+=1
-                last_listing = listing_id                
+
+            if stream_parser is not None:
+                result_count, last_page = stream_parser.result_count, stream_parser.last_page
+            else:
+                search_results, last_page = fetcher.parse("search", url, response)
+                data_pipeline.add_batch(search_results)
+                result_count = len(search_results)
+            if pagination is not None:
+                pagination.observe(page_number, result_count, last_page)
 
             logger.info(f"Successfully parsed data from: {url}")
             success = True
         
                     
+        except SearchPageSkipped:
+            pagination.skip()
+            return 0
+        except (DeadlineExceeded, ParseError):
+            raise
         except Exception as e:
             logger.error(f"An error occurred while processing page {url}: {e}")
-            logger.info(f"Retrying request for page: {url}, retries left {retries-tries}")
+            if tries >= retries:
+                break
+            status_code = response.status_code if response is not None else None
+            headers = response.headers if response is not None else None
+            delay = fetcher.retry_policy.next_delay(tries, status_code, headers)
+            if delay is None:
+                break
+            logger.info(f"Retrying request for page: {url} in {delay:.2f}s, retries left {retries-tries}")
+            fetcher.deadline.sleep(delay)
             tries+=1
 
     if not success:
         raise Exception(f"Max Retries exceeded: {retries}")
+    return result_count
+
+
 
 
+def cancel_pending(futures):
+    # cancel() is also True for a future cancelled earlier, so only count the ones cancelled now
+    cancelled = sum(future.cancel() for future in futures if not future.cancelled())
+    if cancelled:
+        logger.warning(f"Run deadline reached, cancelled {cancelled} queued jobs")
 
 
-def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3):
+def start_scrape(keyword, pages, location, data_pipeline=None, max_threads=5, retries=3, fetcher=None):
+    owns_fetcher = fetcher is None
+    if owns_fetcher:
+        fetcher = Fetcher(max_threads=max_threads)
+    pagination = PaginationTracker(pages)
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-        executor.map(
-            scrape_search_results,
-            [keyword] * pages,
-            [location] * pages,
-            range(pages),
-            [data_pipeline] * pages,
-            [retries] * pages
+        futures = {
+            executor.submit(contextvars.copy_context().run, scrape_search_results, keyword, location, page_number, data_pipeline, retries, fetcher, pagination): page_number
+            for page_number in range(pages)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                logger.error(f"Search page {futures[future] + 1} failed: {future.exception()}")
+            if fetcher.deadline.expired():
+                cancel_pending(futures)
+            for pending, page_number in futures.items():
+                if pagination.is_beyond(page_number) and not pending.cancelled() and pending.cancel():
+                    pagination.skip()
+    pagination.log_stats()
+    if owns_fetcher:
+        fetcher.log_stats()
+        fetcher.close()
+
+
+def review_csv_filename(row):
+    return f"{row['name'].replace(' ', '-').replace('/', '')}.csv"
+
+
+def find_review_cards(soup):
+    # One pass over the tree collects every card; keep the first card per rank, in rank order
+    review_cards = {}
+    for card in soup.find_all("div", id=REVIEW_CARD_ID):
+        review_rank = int(REVIEW_CARD_ID.match(card["id"]).group(1))
+        review_cards.setdefault(review_rank, card)
+    return [review_cards[review_rank] for review_rank in sorted(review_cards)]
+
+
+def extract_review_fields(review_card):
+    # Single walk over the card: the first rating input, the first paragraph (the review
+    # text) and the reviewer link, which the date sits next to
+    rating = None
+    review = None
+    name_date_holder = None
+    for element in review_card.descendants:
+        if not isinstance(element, Tag):
+            continue
+        if rating is None and element.name == "input" and element.get("name") == "rating":
+            rating = element.get("value")
+        elif review is None and element.name == "p":
+            review = element
+        elif name_date_holder is None and element.name == "a" and " ".join(element.get("class", [])) == REVIEWER_LINK_CLASS:
+            name_date_holder = element
+        if rating is not None and review is not None and name_date_holder is not None:
+            break
+    return rating, review, name_date_holder
+
+
+def parse_reviews(html, parser=None, partial=None, structured=None, encoding=None):
+    reviews = parse_structured(html, "listing", json_ld_reviews, structured)
+    if reviews is not None:
+        return reviews
+
+    review_cards = parse_cards(html, "listing", find_review_cards, REVIEW_CARD_STRAINER, parser, partial, encoding)
+
+    reviews = []
+    for review_card in review_cards:
+        rating, review_holder, name_date_holder = extract_review_fields(review_card)
+        if rating is None or review_holder is None or not name_date_holder:
+            continue
+        review = review_holder.text.strip()
+        name = name_date_holder.get("aria-label").replace("Reviewer ", "")
+        if not name:
+            name = "n/a"
+        date = name_date_holder.parent.text.strip().replace(name, "")
+        if date == "":
+            continue
+
+        review_data = ReviewData(
+            name=name,
+            date=date,
+            review=review,
+            stars=rating
         )
+        reviews.append(review_data)
 
+    parse_stats.record_source("listing", "dom", len(reviews))
+    return reviews
 
-def process_item(row, location, retries=3):
-    url = row["url"]
+
+def save_reviews(row, reviews):
+    review_pipeline = DataPipeline(csv_filename=review_csv_filename(row))
+    for review_data in reviews:
+        review_pipeline.add_data(review_data)
+    review_pipeline.close_pipeline()
+
+
+def fetch_reviews(url, location, retries=3, fetcher=None):
     tries = 0
     success = False
+    reviews = []
 
     while tries <= retries and not success:
-        response = requests.get(get_scrapeops_url(url, location=location))
+        response = None
         try:
+            response = fetcher.get(url, location=location, refresh=tries > 0)
             if response.status_code == 200:
                 logger.info(f"Status: {response.status_code}")
 
-                soup = BeautifulSoup(response.text, "html.parser")
-
-                review_cards = []
-                for review_rank in range(4):
-                    card = soup.select_one(f"div[id='review-text-width-{review_rank}']")
-                    if card:
-                        review_cards.append(card)
-                review_pipeline = DataPipeline(csv_filename=f"{row['name'].replace(' ', '-').replace('/', '')}.csv")
-                for review_card in review_cards:
-                    rating = review_card.select_one("input[name='rating']").get("value")
-                    review = review_card.find("p").text.strip()
-                    name_date_holder = review_card.find("a", class_="wt-text-link wt-mr-xs-1")
-                    if not name_date_holder:
-                        continue
-                    name = name_date_holder.get("aria-label").replace("Reviewer ", "")
-                    if not name:
-                        name = "n/a"
-                    date = name_date_holder.parent.text.strip().replace(name, "")
-                    if date == "":
-                        continue
-
-                    review_data = ReviewData(
-                        name=name,
-                        date=date,
-                        review=review,
-                        stars=rating
-                    )
-                    review_pipeline.add_data(review_data)
-
-
-                review_pipeline.close_pipeline()
+                reviews, _ = fetcher.parse("listing", url, response)
                 success = True
 
             else:
                 logger.warning(f"Failed Response: {response.status_code}")
                 raise Exception(f"Failed Request, status code: {response.status_code}")
+        except (DeadlineExceeded, ParseError):
+            raise
         except Exception as e:
             logger.error(f"Exception thrown: {e}")
-            logger.warning(f"Failed to process page: {row['url']}")
-            logger.warning(f"Retries left: {retries-tries}")
+            logger.warning(f"Failed to process page: {url}")
+            if tries >= retries:
+                break
+            status_code = response.status_code if response is not None else None
+            headers = response.headers if response is not None else None
+            delay = fetcher.retry_policy.next_delay(tries, status_code, headers)
+            if delay is None:
+                break
+            logger.warning(f"Retries left: {retries-tries}, next attempt in {delay:.2f}s")
+            fetcher.deadline.sleep(delay)
             tries += 1
     if not success:
         raise Exception(f"Max Retries exceeded: {retries}")
-    else:
+    return reviews
+
+
+def process_item(row, location, retries=3, fetcher=None, review_queue=None):
+    # The same listing often turns up under several keywords: fetch and parse it once,
+    # and write each review file once, however many rows point at it
+    listing_key = normalize_url(row["url"])
+    reviews = fetcher.single_flight.do(listing_key, fetch_reviews, row["url"], location, retries, fetcher)
+    fetcher.single_flight.do((listing_key, review_csv_filename(row)), save_reviews, row, reviews)
+    if review_queue is not None:
+        review_queue.mark_reviewed(row["listing_id"])
+    logger.info(f"Successfully parsed: {row['url']}")
+
+
+
+
+def process_results(rows, location, max_threads=5, retries=3, fetcher=None, review_queue=None):
+    # rows are listing dicts with listing_id, name and url (see ReviewQueue.pending)
+    logger.info(f"processing {len(rows)} listings")
+    owns_fetcher = fetcher is None
+    if owns_fetcher:
+        fetcher = Fetcher(max_threads=max_threads)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
+        futures = {
+            executor.submit(process_item, row, location, retries, fetcher, review_queue): row
+            for row in rows
+        }
+        # Handle listings as they finish rather than in queue order, so one slow page
+        # does not hold back the ones behind it
+        for future in concurrent.futures.as_completed(futures):
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                logger.error(f"Listing {futures[future]['url']} failed: {future.exception()}")
+            if fetcher.deadline.expired():
+                cancel_pending(futures)
+    if owns_fetcher:
+        fetcher.log_stats()
+        fetcher.close()
+
+## Parse failures
+## Tried in order on the same bytes: the configured fast path, a full parse of the DOM, then the
+## stdlib tree builder in case lxml itself is what chokes on the page
+PARSE_ATTEMPTS = [
+    {},
+    {"partial": False, "structured": False},
+    {"parser": "html.parser", "partial": False, "structured": False},
+]
+
+
+class ParseError(Exception):
+
+    def __init__(self, kind, attempts):
+        # Both go to Exception so the error pickles back from a parse process
+        super().__init__(kind, attempts)
+        self.kind = kind
+        self.attempts = attempts
+
+    def __str__(self):
+        return f"{self.kind} page failed to parse {len(self.attempts)} ways, last: {self.attempts[-1]}"
+
+
+class Quarantine:
+
+    def __init__(self, quarantine_dir="quarantine"):
+        self.quarantine_dir = quarantine_dir
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, url, body, error):
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        name = f"{error.kind}-{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}"
+        path = os.path.join(self.quarantine_dir, f"{name}.html")
+        with open(path, "wb") as page_file:
+            page_file.write(body)
+        with open(os.path.join(self.quarantine_dir, f"{name}.json"), "w") as meta_file:
+            json.dump({
+                "url": url,
+                "kind": error.kind,
+                "attempts": error.attempts,
+                "quarantined_at": datetime.now(timezone.utc).isoformat()
+            }, meta_file, indent=2)
+        with self.lock:
+            self.count += 1
+        return path
+
+    def log_stats(self):
+        if self.count:
+            logger.warning(f"Quarantined {self.count} pages that could not be parsed in {self.quarantine_dir}/")
+
+
+def report_parse_failure(url, body, error, quarantine=None):
+    path = None
+    if quarantine is not None and body is not None:
+        path = quarantine.add(url, body, error)
+    logger.error("Parse failure: " + json.dumps({
+        "url": url,
+        "kind": error.kind,
+        "bytes": len(body) if body is not None else None,
+        "attempts": error.attempts,
+        "quarantined": path
+    }))
+
+
+## Parse pool
+RECORD_TYPES = {"search": SearchData, "listing": ReviewData}
+
+
+def parse_page(kind, body, encoding=None):
+    # A changed selector or an odd value fails the same way on every refetch, so re-parse the
+    # bytes in hand in progressively plainer ways and never spend another proxy request
+    attempts = []
+    for options in PARSE_ATTEMPTS:
+        try:
+            if kind == "search":
+                search_results, last_page = parse_search_results(body, encoding=encoding, **options)
+                return coerce_records(search_results), last_page
+            return coerce_records(parse_reviews(body, encoding=encoding, **options)), None
+        except Exception as e:
+            attempts.append(f"{type(e).__name__}: {e}")
+    raise ParseError(kind, attempts)
+
+
+def parse_page_compact(kind, body, encoding=None):
+    # Runs in a parse process: plain tuples pickle smaller and faster than the dataclasses.
+    # The process's own parse_stats never reach the parent, so this page's counts go back too
+    records, last_page = parse_page(kind, body, encoding)
+    return [tuple(getattr(record, name) for name in record.field_names) for record in records], last_page, parse_stats.take()
+
+
+def configure_parsing(parser, partial, structured, structured_search, coerce_types, decimal_separator):
+    # Spawned workers import the module afresh; carry over the parent's parse settings
+    global HTML_PARSER, PARTIAL_PARSE, STRUCTURED_DATA, STRUCTURED_SEARCH, COERCE_TYPES, PRICE_DECIMAL_SEPARATOR
+    HTML_PARSER, PARTIAL_PARSE, STRUCTURED_DATA, STRUCTURED_SEARCH = parser, partial, structured, structured_search
+    COERCE_TYPES, PRICE_DECIMAL_SEPARATOR = coerce_types, decimal_separator
+
+
+class ParsePool:
+
+    def __init__(self, max_workers=None, queue_limit=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Pages handed over but not yet parsed; a fetching thread waits for a free slot,
+        # so downloads cannot run arbitrarily far ahead of the parsers
+        self.queue_limit = queue_limit or self.max_workers * 2
+        self.slots = threading.BoundedSemaphore(self.queue_limit)
+        # "spawn" rather than fork: the workers start while fetch threads hold locks
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=configure_parsing,
+            initargs=(HTML_PARSER, PARTIAL_PARSE, STRUCTURED_DATA, STRUCTURED_SEARCH, COERCE_TYPES, PRICE_DECIMAL_SEPARATOR)
+        )
+        self.pages = collections.Counter()
+        self.seconds = collections.Counter()
+        self.lock = threading.Lock()
+
+    def build(self, kind, compact, seconds):
+        rows, last_page, counts = compact
+        record_type = RECORD_TYPES[kind]
+        parse_stats.merge(counts)
+        with self.lock:
+            self.pages[kind] += 1
+            self.seconds[kind] += seconds
+        return [record_type(*row) for row in rows], last_page
+
+    def parse(self, kind, body, encoding=None):
+        start = time.perf_counter()
+        with self.slots:
+            compact = self.executor.submit(parse_page_compact, kind, body, encoding).result()
+        return self.build(kind, compact, time.perf_counter() - start)
+
+    async def parse_async(self, kind, body, encoding=None):
+        # The caller bounds the queue with its own asyncio semaphore (see AsyncEngine.parse)
+        start = time.perf_counter()
+        compact = await asyncio.wrap_future(self.executor.submit(parse_page_compact, kind, body, encoding))
+        return self.build(kind, compact, time.perf_counter() - start)
+
+    def log_stats(self):
+        for kind, count in sorted(self.pages.items()):
+            average = self.seconds[kind] / count * 1000
+            logger.info(f"Parse pool: {count} {kind} pages across {self.max_workers} processes, {average:.1f} ms per page including queueing")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+## Asyncio engine
+class AsyncEngine:
+
+    def __init__(self, max_concurrency=100, parse_workers=4, concurrency=None, retry_policy=None, rate_limiter=None,
+                 cache=None, proxy_pool=None, hedger=None, timeout=(10, 120), deadline=None, parse_pool=None, quarantine=None):
+        if aiohttp is None:
+            raise ImportError("The asyncio engine requires aiohttp: pip install aiohttp")
+        self.max_concurrency = max_concurrency
+        self.parse_workers = parse_workers
+        self.concurrency = concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.proxy_pool = proxy_pool or ProxyPool.from_config(config)
+        self.hedger = hedger
+        self.timeout = timeout
+        self.deadline = deadline or Deadline()
+        self.single_flight = SingleFlight()
+        self.session = None
+        self.semaphore = None
+        self.slot_condition = None
+        self.parse_executor = None
+        self.stream_executors = []
+        self.parse_pool = parse_pool
+        self.parse_slots = None
+        self.quarantine = quarantine
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.slot_condition = asyncio.Condition()
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency))
+        self.parse_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parse_workers)
+        # An lxml parser must be created and fed on one thread, so each streamed page is pinned to one of these
+        self.stream_executors = [concurrent.futures.ThreadPoolExecutor(max_workers=1) for _ in range(self.parse_workers)]
+        self.stream_executor_cycle = itertools.cycle(self.stream_executors)
+        if self.parse_pool is not None:
+            self.parse_slots = asyncio.Semaphore(self.parse_pool.queue_limit)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.parse_executor.shutdown(wait=True)
+        for executor in self.stream_executors:
+            executor.shutdown(wait=True)
+
+    async def fetch(self, url, location="us", refresh=False):
+        self.deadline.check()
+        if self.cache is not None and not refresh:
+            cached = await self.run_blocking(self.cache.get, url, location)
+            if cached is not None:
+                body, headers = cached
+                return 200, body, CaseInsensitiveDict(headers)
+
+        status_code, body, headers = await self.fetch_body(url, location)
+        if self.cache is not None and status_code == 200:
+            await self.run_blocking(self.cache.set, url, body, headers, location)
+        return status_code, body, headers
+
+    async def fetch_body(self, url, location="us"):
+        if self.hedger is not None:
+            return await self.hedger.run_async(self.fetch_with_failover, url, location)
+        return await self.fetch_with_failover(url, location)
+
+    async def stream_search(self, url, location="us", refresh=False, on_records=None, chunk_size=16 * 1024):
+        self.deadline.check()
+        if self.cache is not None and not refresh:
+            cached = await self.run_blocking(self.cache.get, url, location)
+            if cached is not None:
+                body, headers = cached
+                headers = CaseInsensitiveDict(headers)
+                run_pinned = functools.partial(self.run_on, next(self.stream_executor_cycle))
+                stream_parser = await run_pinned(SearchStreamParser, page_encoding(headers))
+                try:
+                    await run_pinned(stream_parser.consume, [body], on_records)
+                except ParseError as e:
+                    report_parse_failure(url, stream_parser.body, e, self.quarantine)
+                    raise
+                return 200, headers, stream_parser
+
+        stream_parser = None
+        run_pinned = functools.partial(self.run_on, next(self.stream_executor_cycle))
+
+        async def consume(response):
+            nonlocal stream_parser
+            stream_parser = await run_pinned(SearchStreamParser, page_encoding(response.headers))
+            return await stream_parser.consume_async(response.content.iter_chunked(chunk_size), on_records, run_pinned, self.cache is not None)
+
+        try:
+            status_code, body, headers = await self.fetch_with_failover(url, location, consume)
+        except ParseError as e:
+            report_parse_failure(url, stream_parser.body, e, self.quarantine)
+            raise
+        if self.cache is not None and status_code == 200 and body is not None:
+            await self.run_blocking(self.cache.set, url, body, headers, location)
+        return status_code, headers, stream_parser
+
+    async def fetch_with_failover(self, url, location="us", consume=None):
+        tried = []
+        while True:
+            backend = self.proxy_pool.choose(exclude=tried)
+            tried.append(backend)
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(url, backend.api_key)
+            await self.reserve_backend(backend)
+            try:
+                status_code, body, headers = await self.send_via(backend, url, location, consume)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not self.proxy_pool.can_fail_over(tried):
+                    raise
+                logger.warning(f"Proxy {backend.name} failed ({e}), failing over")
+                continue
+            finally:
+                await self.release_backend(backend)
+            if is_overloaded(status_code) and self.proxy_pool.can_fail_over(tried):
+                logger.warning(f"Proxy {backend.name} returned {status_code}, failing over")
+                continue
+            return status_code, body, headers
+
+    async def reserve_backend(self, backend):
+        async with self.slot_condition:
+            while not self.proxy_pool.try_reserve(backend):
+                await self.slot_condition.wait()
+
+    async def release_backend(self, backend):
+        self.proxy_pool.release(backend)
+        async with self.slot_condition:
+            self.slot_condition.notify_all()
+
+    async def send_via(self, backend, url, location="us", consume=None):
+        async with self.semaphore:
+            if self.concurrency is not None:
+                async with self.slot_condition:
+                    await self.slot_condition.wait_for(lambda: self.concurrency.in_flight < self.concurrency.limit)
+                    self.concurrency.in_flight += 1
+            try:
+                request_starting()
+            except SearchPageSkipped:
+                if self.concurrency is not None:
+                    async with self.slot_condition:
+                        self.concurrency.in_flight -= 1
+                        self.slot_condition.notify_all()
+                raise
+            status_code = None
+            start = time.monotonic()
+            try:
+                connect_timeout, read_timeout = self.deadline.clamp(self.timeout)
+                timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout, total=self.deadline.remaining())
+                status_code, body, headers = await self.send(backend.build_url(url, location), timeout, consume)
+                return status_code, body, headers
+            finally:
+                latency = time.monotonic() - start
+                backend.record(status_code, latency)
+                if self.concurrency is not None:
+                    async with self.slot_condition:
+                        self.concurrency.in_flight -= 1
+                        self.concurrency.record(status_code, latency)
+                        self.slot_condition.notify_all()
+
+    async def send(self, proxy_url, timeout, consume=None):
+        async with self.session.get(proxy_url, timeout=timeout) as response:
+            if consume is not None and response.status == 200:
+                # Streamed: consume reads as much of the body as it needs
+                return response.status, await consume(response), response.headers
+            body = await response.read()
+            return response.status, body, response.headers
+
+    async def run_blocking(self, func, *args):
+        # Parsing and CSV writes run on the parse pool so they never stall the event loop
+        return await self.run_on(self.parse_executor, func, *args)
+
+    async def run_on(self, executor, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, func, *args)
+
+    async def parse(self, kind, url, body, headers):
+        encoding = page_encoding(headers)
+        try:
+            if self.parse_pool is None:
+                return await self.run_blocking(parse_page, kind, body, encoding)
+            async with self.parse_slots:
+                return await self.parse_pool.parse_async(kind, body, encoding)
+        except ParseError as e:
+            report_parse_failure(url, body, e, self.quarantine)
+            raise
+
+    async def scrape_search_results(self, keyword, location, page_number, data_pipeline=None, retries=3, pagination=None):
+        url = search_url(keyword, page_number)
+        tries = 0
+        success = False
+        result_count = 0
+        if pagination is not None:
+            # Only this task's context sees it
+            ON_REQUEST_SENT.set(functools.partial(pagination.start_request, page_number))
+
+        while tries <= retries and not success:
+            if pagination is not None and pagination.is_beyond(page_number):
+                pagination.skip()
+                return 0
+            status_code = None
+            headers = None
+            try:
+                stream_parser = None
+                if STREAM_SEARCH:
+                    status_code, headers, stream_parser = await self.stream_search(url, location=location, refresh=tries > 0, on_records=data_pipeline.add_batch)
+                else:
+                    status_code, body, headers = await self.fetch(url, location=location, refresh=tries > 0)
+                logger.info(f"Recieved [{status_code}] from: {url}")
+                if status_code != 200:
+                    raise Exception(f"Failed request, Status Code {status_code}")
+
+                if stream_parser is not None:
+                    result_count, last_page = stream_parser.result_count, stream_parser.last_page
+                else:
+                    search_results, last_page = await self.parse("search", url, body, headers)
+                    # The dedup lookup (SQLite with a persistent index) and any flush stay off the event loop
+                    await self.run_blocking(data_pipeline.add_batch, search_results)
+                    result_count = len(search_results)
+                if pagination is not None:
+                    pagination.observe(page_number, result_count, last_page)
+
+                logger.info(f"Successfully parsed data from: {url}")
+                success = True
+
+            except SearchPageSkipped:
+                pagination.skip()
+                return 0
+            except (DeadlineExceeded, ParseError):
+                raise
+            except Exception as e:
+                logger.error(f"An error occurred while processing page {url}: {e}")
+                if tries >= retries:
+                    break
+                delay = self.retry_policy.next_delay(tries, status_code, headers)
+                if delay is None:
+                    break
+                logger.info(f"Retrying request for page: {url} in {delay:.2f}s, retries left {retries-tries}")
+                await self.deadline.sleep_async(delay)
+                tries+=1
+
+        if not success:
+            raise Exception(f"Max Retries exceeded: {retries}")
+        return result_count
+
+    async def start_scrape(self, keyword, pages, location, data_pipeline=None, retries=3):
+        pagination = PaginationTracker(pages)
+        tasks = {
+            asyncio.create_task(self.scrape_search_results(keyword, location, page_number, data_pipeline=data_pipeline, retries=retries, pagination=pagination)): page_number
+            for page_number in range(pages)
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(f"Search page {tasks[task] + 1} failed: {task.exception()}")
+            deadline_cancelled = 0
+            for task in list(pending):
+                page_number = tasks[task]
+                beyond = pagination.is_beyond(page_number)
+                if beyond or self.deadline.expired():
+                    task.cancel()
+                    pending.discard(task)
+                    # In-flight pages are cancelled too, but only a page still queued saved a request
+                    if beyond and not pagination.was_sent(page_number):
+                        pagination.skip()
+                    elif not beyond:
+                        deadline_cancelled += 1
+            if deadline_cancelled:
+                logger.warning(f"Run deadline reached, cancelled {deadline_cancelled} search pages")
+        pagination.log_stats()
+
+    async def fetch_reviews(self, url, location, retries=3):
+        tries = 0
+        success = False
+        reviews = []
+
+        while tries <= retries and not success:
+            status_code = None
+            headers = None
+            try:
+                status_code, body, headers = await self.fetch(url, location=location, refresh=tries > 0)
+                if status_code == 200:
+                    logger.info(f"Status: {status_code}")
+                    reviews, _ = await self.parse("listing", url, body, headers)
+                    success = True
+                else:
+                    logger.warning(f"Failed Response: {status_code}")
+                    raise Exception(f"Failed Request, status code: {status_code}")
+            except (DeadlineExceeded, ParseError):
+                raise
+            except Exception as e:
+                logger.error(f"Exception thrown: {e}")
+                logger.warning(f"Failed to process page: {url}")
+                if tries >= retries:
+                    break
+                delay = self.retry_policy.next_delay(tries, status_code, headers)
+                if delay is None:
+                    break
+                logger.warning(f"Retries left: {retries-tries}, next attempt in {delay:.2f}s")
+                await self.deadline.sleep_async(delay)
+                tries += 1
+        if not success:
+            raise Exception(f"Max Retries exceeded: {retries}")
+        return reviews
+
+    async def process_item(self, row, location, retries=3, review_queue=None):
+        listing_key = normalize_url(row["url"])
+        reviews = await self.single_flight.do_async(listing_key, self.fetch_reviews, row["url"], location, retries)
+        await self.single_flight.do_async((listing_key, review_csv_filename(row)), self.run_blocking, save_reviews, row, reviews)
+        if review_queue is not None:
+            await self.run_blocking(review_queue.mark_reviewed, row["listing_id"])
         logger.info(f"Successfully parsed: {row['url']}")
 
+    async def process_results(self, rows, location, retries=3, review_queue=None):
+        logger.info(f"processing {len(rows)} listings")
+        await gather_logged(self.process_item(row, location, retries=retries, review_queue=review_queue) for row in rows)
 
 
+async def gather_logged(coroutines):
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Task failed: {result}")
+    return results
+
+
+async def run_async_crawl(keyword_list, pages, location, max_concurrency=100, retries=3, concurrency=None, retry_policy=None, rate_limiter=None,
+                          cache=None, proxy_pool=None, hedger=None, timeout=(10, 120), deadline=None, parse_pool=None, quarantine=None,
+                          dedup_capacity=0, dedup_error_rate=0.001, seen_store=None, review_queue=None):
+    aggregate_files = []
+    deadline = deadline or Deadline()
+    if review_queue is None:
+        review_queue = seen_store.review_queue() if seen_store is not None else ReviewQueue()
+    async with AsyncEngine(max_concurrency=max_concurrency, concurrency=concurrency, retry_policy=retry_policy, rate_limiter=rate_limiter,
+                           cache=cache, proxy_pool=proxy_pool, hedger=hedger, timeout=timeout, deadline=deadline, parse_pool=parse_pool, quarantine=quarantine) as engine:
+        for keyword in keyword_list:
+            if deadline.expired():
+                logger.warning(f"Run deadline reached, skipping keyword: {keyword}")
+                continue
+            filename = keyword.replace(" ", "-")
+
+            # The CSV keeps every run's listings; the review queue gets the ones written now
+            crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv", dedup_key="listing_id", seen=seen_index(dedup_capacity, dedup_error_rate, seen_store, filename), sinks=[review_queue])
+            try:
+                await engine.start_scrape(keyword, pages, location, data_pipeline=crawl_pipeline, retries=retries)
+            finally:
+                await engine.run_blocking(crawl_pipeline.close_pipeline)
+            crawl_pipeline.seen.log_stats(filename)
+            if crawl_pipeline.saved_count == 0:
+                logger.info(f"No new listings for keyword: {keyword}")
+                continue
+            aggregate_files.append(f"{filename}.csv")
+        logger.info(f"Crawl complete.")
+
+        # This run's new listings plus any whose reviews an earlier run did not finish
+        listings = await engine.run_blocking(review_queue.pending)
+        if deadline.expired():
+            logger.warning(f"Run deadline reached, skipping reviews for {len(listings)} listings")
+        elif listings:
+            await engine.process_results(listings, location, retries=retries, review_queue=review_queue)
+        await engine.run_blocking(review_queue.log_stats)
+        engine.single_flight.log_stats()
+    return aggregate_files
 
-def process_results(csv_file, location, max_threads=5, retries=3):
-    logger.info(f"processing {csv_file}")
-    with open(csv_file, newline="") as file:
-        reader = list(csv.DictReader(file))
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as executor:
-            executor.map(
-                process_item,
-                reader,
-                [location] * len(reader),
-                [retries] * len(reader)
-            )
 
 if __name__ == "__main__":
 
@@ -301,6 +2974,51 @@ if __name__ == "__main__":
     MAX_THREADS = 5
     PAGES = 1
     LOCATION = "us"
+    ## "threads" or "asyncio"
+    ENGINE = "threads"
+    MAX_CONCURRENCY = 100
+    ## AIMD: start at MAX_THREADS, grow while the proxy is healthy, halve on 429/5xx or slow p95
+    ADAPTIVE_CONCURRENCY = True
+    MIN_CONCURRENCY = 1
+    ADAPTIVE_MAX_CONCURRENCY = 50
+    LATENCY_TARGET = 10.0
+    ## Exponential backoff with full jitter; RETRY_BUDGET caps retries across the whole run
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 30.0
+    RETRY_BUDGET = 100
+    ## Requests per second allowed by the proxy plan (per API key) and, optionally, per target host.
+    ## A "rate_limit" on a proxy entry in config.json overrides PROXY_RATE_LIMIT for that key.
+    PROXY_RATE_LIMIT = 5
+    HOST_RATE_LIMITS = {}
+    ## On-disk response cache: search pages go stale quickly, listing pages much later
+    USE_CACHE = True
+    CACHE_DIR = ".http_cache"
+    CACHE_MAX_BYTES = 500 * 1024 * 1024
+    SEARCH_TTL = 60 * 60
+    LISTING_TTL = 7 * 24 * 60 * 60
+    ## Re-issue a fetch that runs past the observed p95 latency, adding at most HEDGE_MAX_EXTRA extra load.
+    ## Off by default: every hedge is a paid proxy request
+    HEDGE_REQUESTS = False
+    HEDGE_MAX_EXTRA = 0.1
+    ## (connect, read) seconds for every proxy request, and a hard cap on the whole run (None for no cap)
+    REQUEST_TIMEOUT = (10, 120)
+    RUN_DEADLINE = 60 * 60
+    ## Fetch workers hand raw pages to this many parse processes (0 parses on the fetching threads);
+    ## at most PARSE_QUEUE_LIMIT pages wait for a parser before fetching pauses
+    PARSE_PROCESSES = os.cpu_count() or 1
+    PARSE_QUEUE_LIMIT = 2 * PARSE_PROCESSES
+    ## Pages that fail every parse attempt are saved here (with the errors) instead of being refetched
+    QUARANTINE_DIR = "quarantine"
+    ## Search results are deduplicated on listing_id with an exact set; for crawls of tens of millions
+    ## of listings set a capacity to use a fixed-size Bloom filter with that false-positive rate instead
+    ## (only when DEDUP_INDEX is off)
+    DEDUP_BLOOM_CAPACITY = 0
+    DEDUP_ERROR_RATE = 0.001
+    ## Listing ids saved by earlier runs are kept here and skipped, so a daily crawl only writes (and
+    ## fetches reviews for) new listings; listings whose reviews a run did not finish are retried by the
+    ## next one. None turns it off. Ids unseen for DEDUP_INDEX_MAX_AGE are dropped
+    DEDUP_INDEX = "seen-listings.sqlite"
+    DEDUP_INDEX_MAX_AGE = 90 * 24 * 60 * 60
 
     logger.info(f"Crawl starting...")
 
@@ -308,15 +3026,88 @@ if __name__ == "__main__":
     keyword_list = ["coffee mug"]
     aggregate_files = []
 
-    ## Job Processes
-    for keyword in keyword_list:
-        filename = keyword.replace(" ", "-")
+    deadline = Deadline(RUN_DEADLINE)
+    retry_policy = RetryPolicy(base_delay=BACKOFF_BASE, max_delay=BACKOFF_MAX, retry_budget=RETRY_BUDGET)
+    ## Several keys/providers can be listed under "proxies" in config.json, e.g.
+    ## {"name": "backup", "api_key": "...", "endpoint": "https://...", "max_concurrency": 5, "weight": 0.5}
+    proxy_pool = ProxyPool.from_config(config)
+    rate_limiter = RateLimiter(default_key_rate=PROXY_RATE_LIMIT, host_rates=HOST_RATE_LIMITS, key_rates=proxy_pool.key_rates())
+    hedger = None
+    if HEDGE_REQUESTS:
+        hedger = Hedger(max_extra_ratio=HEDGE_MAX_EXTRA, max_workers=MAX_CONCURRENCY)
+    cache = None
+    if USE_CACHE:
+        cache = ResponseCache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, search_ttl=SEARCH_TTL, listing_ttl=LISTING_TTL)
+    concurrency = None
+    pool_size = MAX_THREADS
+    if ADAPTIVE_CONCURRENCY:
+        concurrency = AdaptiveConcurrency(
+            initial_limit=MAX_THREADS,
+            min_limit=MIN_CONCURRENCY,
+            max_limit=ADAPTIVE_MAX_CONCURRENCY,
+            latency_target=LATENCY_TARGET
+        )
+        pool_size = ADAPTIVE_MAX_CONCURRENCY
+    parse_pool = None
+    if PARSE_PROCESSES:
+        parse_pool = ParsePool(max_workers=PARSE_PROCESSES, queue_limit=PARSE_QUEUE_LIMIT)
+    quarantine = Quarantine(QUARANTINE_DIR)
+    seen_store = None
+    review_queue = ReviewQueue()
+    if DEDUP_INDEX:
+        seen_store = SeenStore(DEDUP_INDEX)
+        seen_store.compact(DEDUP_INDEX_MAX_AGE)
+        review_queue = seen_store.review_queue()
+
+    if ENGINE == "asyncio":
+        asyncio.run(run_async_crawl(keyword_list, PAGES, LOCATION, max_concurrency=MAX_CONCURRENCY, retries=MAX_RETRIES, concurrency=concurrency, retry_policy=retry_policy, rate_limiter=rate_limiter, cache=cache, proxy_pool=proxy_pool, hedger=hedger, timeout=REQUEST_TIMEOUT, deadline=deadline, parse_pool=parse_pool, quarantine=quarantine,
+                                   dedup_capacity=DEDUP_BLOOM_CAPACITY, dedup_error_rate=DEDUP_ERROR_RATE, seen_store=seen_store, review_queue=review_queue))
+    else:
+        ## Shared keep-alive connection pool for every fetch in the run
+        fetcher = Fetcher(max_threads=pool_size, concurrency=concurrency, retry_policy=retry_policy, rate_limiter=rate_limiter, cache=cache, proxy_pool=proxy_pool, hedger=hedger,
+                          timeout=REQUEST_TIMEOUT, deadline=deadline, parse_pool=parse_pool, quarantine=quarantine)
+
+        ## Job Processes
+        for keyword in keyword_list:
+            if deadline.expired():
+                logger.warning(f"Run deadline reached, skipping keyword: {keyword}")
+                continue
+            filename = keyword.replace(" ", "-")
+
+            # The CSV keeps every run's listings; the review queue gets the ones written now
+            crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv", dedup_key="listing_id", seen=seen_index(DEDUP_BLOOM_CAPACITY, DEDUP_ERROR_RATE, seen_store, filename), sinks=[review_queue])
+            try:
+                start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=pool_size, retries=MAX_RETRIES, fetcher=fetcher)
+            finally:
+                crawl_pipeline.close_pipeline()
+            crawl_pipeline.seen.log_stats(filename)
+            if crawl_pipeline.saved_count == 0:
+                logger.info(f"No new listings for keyword: {keyword}")
+                continue
+            aggregate_files.append(f"{filename}.csv")
+        logger.info(f"Crawl complete.")
+
+        ## Reviews for this run's new listings plus any an earlier run did not finish
+        listings = review_queue.pending()
+        if deadline.expired():
+            logger.warning(f"Run deadline reached, skipping reviews for {len(listings)} listings")
+        elif listings:
+            process_results(listings, LOCATION, max_threads=pool_size, retries=MAX_RETRIES, fetcher=fetcher, review_queue=review_queue)
+        review_queue.log_stats()
 
-        crawl_pipeline = DataPipeline(csv_filename=f"{filename}.csv")
-        start_scrape(keyword, PAGES, LOCATION, data_pipeline=crawl_pipeline, max_threads=MAX_THREADS, retries=MAX_RETRIES)
-        crawl_pipeline.close_pipeline()
-        aggregate_files.append(f"{filename}.csv")
-    logger.info(f"Crawl complete.")
+        fetcher.log_stats()
+        fetcher.single_flight.log_stats()
+        fetcher.close()
 
-    for file in aggregate_files:
-        process_results(file, LOCATION, max_threads=MAX_THREADS, retries=MAX_RETRIES)
\ No newline at end of file
+    proxy_pool.log_stats()
+    parse_stats.log_stats()
+    if parse_pool is not None:
+        parse_pool.log_stats()
+        parse_pool.close()
+    quarantine.log_stats()
+    if seen_store is not None:
+        seen_store.close()
+    if hedger is not None:
+        hedger.log_stats()
+    if cache is not None:
+        cache.log_stats()
@@ -0,0 +1,16 @@
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def load_scraper():
+    # scraper-proxy.py is a script, not an importable module name
+    spec = importlib.util.spec_from_file_location("scraper_proxy", ROOT / "scraper-proxy.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+scraper = load_scraper()
@@ -0,0 +1,189 @@
+import csv
+from decimal import Decimal
+
+import pytest
+
+from scraper_module import scraper
+
+
+def listing(listing_id, name="Mug"):
+    return scraper.SearchData(name=name, stars=4.5, url=f"https://www.etsy.com/listing/{listing_id}/mug", price_currency="$",
+                              listing_id=listing_id, current_price=Decimal("12.00"), original_price=Decimal("15.00"))
+
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+## In-memory indexes
+def test_seen_set():
+    seen = scraper.SeenSet()
+    assert seen.check_and_add_many([1, 2, 1, 3, 2]) == [False, False, True, False, True]
+    assert seen.check_and_add(3)
+    assert seen.stats() == {"keys": 3, "duplicates": 3}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = scraper.BloomFilter(1000, 0.01)
+    bloom.check_and_add_many(range(1000))
+    assert all(bloom.check_and_add_many(range(1000)))
+
+
+@pytest.mark.parametrize("error_rate", [0.01, 0.001])
+def test_bloom_filter_false_positive_rate(error_rate):
+    capacity = 20000
+    bloom = scraper.BloomFilter(capacity, error_rate)
+    bloom.check_and_add_many(range(capacity))
+    assert bloom.stats()["false_positive_rate"] == pytest.approx(error_rate, rel=0.3)
+    # Unseen keys reported as seen; few enough probes that the fill barely moves
+    probes = [f"unseen-{i}" for i in range(capacity // 10)]
+    assert sum(bloom.check_and_add_many(probes)) / len(probes) < error_rate * 2
+
+
+def test_bloom_filter_stats():
+    bloom = scraper.BloomFilter(1000, 0.01)
+    bloom.check_and_add_many(["a", "b", "a"])
+    stats = bloom.stats()
+    assert stats["keys"] == 2
+    assert stats["duplicates"] == 1
+    assert stats["capacity"] == 1000
+    assert stats["bytes"] == len(bloom.bits) == (bloom.bit_count + 7) // 8
+    # About 9.6 bits and 7 hashes per key for a 1% error rate
+    assert bloom.bit_count == pytest.approx(9585, abs=1)
+    assert stats["hash_count"] == 7
+    assert stats["false_positive_rate"] < 1e-6
+
+
+def test_bloom_filter_warns_past_capacity(caplog):
+    bloom = scraper.BloomFilter(10, 0.01)
+    bloom.check_and_add_many(range(20))
+    bloom.log_stats("test")
+    assert "exceed the Bloom filter capacity" in caplog.text
+
+
+@pytest.mark.parametrize("bloom_capacity, index_type", [(0, "SeenSet"), (1000, "BloomFilter")])
+def test_seen_index_choice(bloom_capacity, index_type):
+    assert type(scraper.seen_index(bloom_capacity)).__name__ == index_type
+
+
+## Pipeline dedup keys
+@pytest.mark.parametrize("columnar", [True, False])
+def test_pipeline_drops_duplicate_keys(tmp_path, columnar):
+    filename = tmp_path / "listings.csv"
+    pipeline = scraper.DataPipeline(csv_filename=str(filename), columnar=columnar, dedup_key="listing_id")
+    pipeline.add_batch([listing(1), listing(2), listing(1, name="Other mug")])
+    pipeline.add_data(listing(2))
+    pipeline.close_pipeline()
+    assert [row["listing_id"] for row in csv_rows(filename)] == ["1", "2"]
+    assert pipeline.saved_count == 2
+    assert pipeline.seen.duplicates == 2
+
+
+def test_pipeline_keeps_records_without_a_key(tmp_path):
+    filename = tmp_path / "listings.csv"
+    pipeline = scraper.DataPipeline(csv_filename=str(filename), dedup_key="listing_id")
+    pipeline.add_batch([listing(None), listing(None), listing(3)])
+    pipeline.close_pipeline()
+    assert len(csv_rows(filename)) == 3
+
+
+def test_pipeline_tuple_dedup_key(tmp_path):
+    filename = tmp_path / "listings.csv"
+    pipeline = scraper.DataPipeline(csv_filename=str(filename), dedup_key=("name", "listing_id"))
+    pipeline.add_batch([listing(1, "A"), listing(1, "B"), listing(1, "A")])
+    pipeline.close_pipeline()
+    assert [(row["name"], row["listing_id"]) for row in csv_rows(filename)] == [("A", "1"), ("B", "1")]
+
+
+## Persistent index
+@pytest.fixture
+def store(tmp_path):
+    store = scraper.SeenStore(str(tmp_path / "seen.sqlite"), lookup_batch_size=3)
+    yield store
+    store.close()
+
+
+def test_seen_store_batched_lookup(store):
+    store.save("coffee-mug", [str(key) for key in range(10)], 100.0)
+    statements = []
+    store.connection.set_trace_callback(statements.append)
+    found = store.lookup("coffee-mug", [str(key) for key in range(12)], 200.0)
+    store.connection.set_trace_callback(None)
+    assert found == {str(key) for key in range(10)}
+    assert len([statement for statement in statements if statement.startswith("SELECT")]) == 4
+    assert store.lookup("tea-mug", ["1"], 200.0) == set()
+    last_seen = dict(store.connection.execute("SELECT key, last_seen FROM seen WHERE namespace = 'coffee-mug'").fetchall())
+    assert set(last_seen.values()) == {200.0}
+
+
+def test_persistent_index_saves_after_flush(store, tmp_path):
+    pipeline = scraper.DataPipeline(csv_filename=str(tmp_path / "coffee-mug.csv"), dedup_key="listing_id", seen=store.index("coffee-mug"))
+    pipeline.add_batch([listing(1), listing(2), listing(1)])
+    # Accepted but not written yet: another run would still take them as new
+    assert pipeline.seen.pending == {"1", "2"}
+    assert store.lookup("coffee-mug", ["1", "2"], 0.0) == set()
+    pipeline.close_pipeline()
+    assert pipeline.seen.pending == set()
+    assert store.lookup("coffee-mug", ["1", "2"], 0.0) == {"1", "2"}
+    assert pipeline.seen.stats() == {"saved": 2, "known": 0, "duplicates": 1}
+
+    next_run = store.index("coffee-mug")
+    assert next_run.check_and_add_many([1, 2, 3]) == [True, True, False]
+    assert next_run.stats() == {"saved": 0, "known": 2, "duplicates": 0}
+
+
+def test_seen_store_compaction(store):
+    now = scraper.time.time()
+    store.save("coffee-mug", ["old", "new"], now)
+    store.connection.execute("UPDATE seen SET last_seen = ? WHERE key = 'old'", (now - 1000,))
+    store.connection.commit()
+    assert store.compact(500) == 1
+    assert [row[0] for row in store.connection.execute("SELECT key FROM seen")] == ["new"]
+    assert store.compact(500) == 0
+
+
+## Review queue
+def crawl_day(store, keyword, listing_ids, reviews_ok, tmp_path):
+    # One run: write the keyword's new listings, then review whatever is queued
+    filename = tmp_path / f"{keyword}.csv"
+    review_queue = store.review_queue()
+    pipeline = scraper.DataPipeline(csv_filename=str(filename), dedup_key="listing_id", seen=store.index(keyword), sinks=[review_queue])
+    pipeline.add_batch([listing(listing_id) for listing_id in listing_ids])
+    pipeline.close_pipeline()
+    reviewed = []
+    for row in review_queue.pending():
+        if reviews_ok:
+            review_queue.mark_reviewed(row["listing_id"])
+            reviewed.append(int(row["listing_id"]))
+    return pipeline.saved_count, sorted(reviewed), len(csv_rows(filename))
+
+
+def test_review_queue_across_runs(store, tmp_path):
+    # Day one's reviews fail, day two picks them up with the new listings, day three has nothing new
+    assert crawl_day(store, "coffee-mug", range(24), False, tmp_path) == (24, [], 24)
+    assert crawl_day(store, "coffee-mug", range(36), True, tmp_path) == (12, list(range(36)), 36)
+    assert crawl_day(store, "coffee-mug", range(36), True, tmp_path) == (0, [], 36)
+    # Saved again under another keyword, but reviews are keyed on listing id alone
+    assert crawl_day(store, "tea-mug", range(30, 40), True, tmp_path) == (10, [36, 37, 38, 39], 10)
+    assert store.review_queue().pending() == []
+
+
+def test_review_queue_compaction(store, tmp_path):
+    crawl_day(store, "coffee-mug", [1, 2], False, tmp_path)
+    store.connection.execute("UPDATE reviews SET last_seen = 0 WHERE listing_id = '1'")
+    store.connection.commit()
+    store.compact(500)
+    assert [row["listing_id"] for row in store.review_queue().pending()] == ["2"]
+
+
+def test_in_memory_review_queue(tmp_path):
+    review_queue = scraper.ReviewQueue()
+    for keyword, listing_ids in (("coffee-mug", [1, 2]), ("tea-mug", [2, 3])):
+        pipeline = scraper.DataPipeline(csv_filename=str(tmp_path / f"{keyword}.csv"), dedup_key="listing_id", columnar=keyword == "tea-mug", sinks=[review_queue])
+        pipeline.add_batch([listing(listing_id) for listing_id in listing_ids])
+        pipeline.close_pipeline()
+    assert [row["listing_id"] for row in review_queue.pending()] == ["1", "2", "3"]
+    review_queue.mark_reviewed("2")
+    assert [row["listing_id"] for row in review_queue.pending()] == ["1", "3"]
+    assert review_queue.pending()[0] == {"listing_id": "1", "name": "Mug", "url": "https://www.etsy.com/listing/1/mug"}
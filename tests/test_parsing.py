@@ -0,0 +1,225 @@
+from decimal import Decimal
+
+import pytest
+
+from scraper_module import FIXTURES, scraper
+
+# search-split-grid.html: the grid is split over two lists, with a pagination nav above it too
+# search-nested-cards.html: some cards wrap their content in a second wt-height-full block
+SEARCH_PAGES = ["search-page.html", "search-split-grid.html", "search-nested-cards.html"]
+JSON_LD_SEARCH_PAGES = ["search-page.html"]
+LISTING_PAGES = ["listing-page.html"]
+
+
+def fixture_bytes(name):
+    return (FIXTURES / name).read_bytes()
+
+
+def rows(records):
+    return [tuple(getattr(record, name) for name in record.field_names) for record in records]
+
+
+def stream_records(body, chunk_size):
+    stream_parser = scraper.SearchStreamParser("utf-8", structured=False)
+    records = []
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+    stream_parser.consume(chunks, records.extend)
+    return records, stream_parser
+
+
+@pytest.fixture
+def dom_only(monkeypatch):
+    # Search pages read JSON-LD only under STRUCTURED_SEARCH; pin it off so parse_page
+    # compares against the same DOM extraction the stream parser uses
+    monkeypatch.setattr(scraper, "STRUCTURED_SEARCH", False)
+
+
+## Tree builders and partial parsing
+@pytest.mark.parametrize("page", SEARCH_PAGES)
+def test_search_lxml_matches_html_parser(page):
+    pytest.importorskip("lxml")
+    body = fixture_bytes(page)
+    expected = scraper.parse_search_results(body, parser="html.parser", partial=False, structured=False, encoding="utf-8")
+    for partial in (False, True):
+        records, last_page = scraper.parse_search_results(body, parser="lxml", partial=partial, structured=False, encoding="utf-8")
+        assert rows(records) == rows(expected[0])
+        assert last_page == expected[1]
+
+
+@pytest.mark.parametrize("page", SEARCH_PAGES)
+def test_search_partial_matches_full(page):
+    body = fixture_bytes(page)
+    full, full_last_page = scraper.parse_search_results(body, parser="html.parser", partial=False, structured=False, encoding="utf-8")
+    partial, partial_last_page = scraper.parse_search_results(body, parser="html.parser", partial=True, structured=False, encoding="utf-8")
+    assert full
+    assert rows(partial) == rows(full)
+    assert partial_last_page == full_last_page
+
+
+@pytest.mark.parametrize("page", LISTING_PAGES)
+def test_reviews_match_across_parsers(page):
+    body = fixture_bytes(page)
+    expected = rows(scraper.parse_reviews(body, parser="html.parser", partial=False, structured=False, encoding="utf-8"))
+    assert expected
+    parsers = ["html.parser", "lxml"] if scraper.lxml is not None else ["html.parser"]
+    for parser in parsers:
+        for partial in (False, True):
+            reviews = scraper.parse_reviews(body, parser=parser, partial=partial, structured=False, encoding="utf-8")
+            assert rows(reviews) == expected
+
+
+def test_search_fields():
+    records, last_page = scraper.parse_page("search", fixture_bytes("search-page.html"), "utf-8")
+    assert last_page == 250
+    # The repeated card and the ad tile without a title are dropped
+    assert [record.listing_id for record in records] == [1201459831, 988120433, 1457009215, 733350018, 1622040087]
+    first = records[0]
+    assert first.name == "Speckled Stoneware Mug – Handmade"
+    assert first.price_currency == "$"
+    assert (first.current_price, first.original_price) == (Decimal("24.00"), Decimal("32.00"))
+    assert first.stars == 4.9
+    assert records[1].current_price == Decimal("1015.50")
+    assert records[2].name == "Café au lait Bowl ☕ Ceramic"
+
+
+## JSON-LD fast path
+def without(records, *names):
+    return [tuple(getattr(record, name) for name in record.field_names if name not in names) for record in records]
+
+
+@pytest.mark.parametrize("page", LISTING_PAGES)
+def test_json_ld_reviews_match_dom(page):
+    body = fixture_bytes(page)
+    dom = scraper.coerce_records(scraper.parse_reviews(body, structured=False, encoding="utf-8"))
+    structured = scraper.coerce_records(scraper.parse_reviews(body, structured=True, encoding="utf-8"))
+    assert {review.source for review in structured} == {"json-ld"}
+    assert without(structured, "source") == without(dom, "source")
+
+
+@pytest.mark.parametrize("replacement", [b'"review": [], "unused": [', b'"review": [{"@type": "Review"}], "unused": ['])
+def test_json_ld_reviews_without_usable_reviews_fall_back_to_dom(replacement):
+    body = fixture_bytes("listing-page.html").replace(b'"review": [', replacement, 1)
+    dom = scraper.parse_reviews(body, structured=False, encoding="utf-8")
+    reviews = scraper.parse_reviews(body, structured=True, encoding="utf-8")
+    assert reviews
+    assert rows(reviews) == rows(dom)
+
+
+@pytest.mark.parametrize("page", JSON_LD_SEARCH_PAGES)
+def test_json_ld_search_matches_dom(page):
+    body = fixture_bytes(page)
+    dom, dom_last_page = scraper.parse_search_results(body, structured=False, encoding="utf-8")
+    structured, last_page = scraper.parse_search_results(body, structured=True, encoding="utf-8")
+    assert {record.source for record in structured} == {"json-ld"}
+    # The ItemList has no pre-sale price, which is why STRUCTURED_SEARCH is off by default
+    assert without(scraper.coerce_records(structured), "source", "original_price") == without(scraper.coerce_records(dom), "source", "original_price")
+    assert last_page == dom_last_page
+
+
+def test_search_defaults_to_dom():
+    records, _ = scraper.parse_page("search", fixture_bytes("search-page.html"), "utf-8")
+    assert {record.source for record in records} == {"dom"}
+
+
+def test_review_date():
+    assert scraper.review_date("2026-03-03") == "Mar 3, 2026"
+    assert scraper.review_date("2026-11-20T08:15:00") == "Nov 20, 2026"
+    assert scraper.review_date("last week") == "last week"
+
+
+def test_parse_pool_carries_worker_stats():
+    # parse_page_compact runs in a parse process; its counts must reach the parent's parse_stats
+    scraper.parse_stats.take()
+    compact = scraper.parse_page_compact("search", fixture_bytes("search-page.html"), "utf-8")
+    assert not scraper.parse_stats.records
+    pool = scraper.ParsePool(max_workers=1)
+    try:
+        records, _ = pool.build("search", compact, 0.0)
+    finally:
+        pool.close()
+    assert scraper.parse_stats.records[("search", "dom")] == len(records)
+    assert sum(scraper.parse_stats.parses.values()) == 1
+
+
+## Streaming
+@pytest.mark.parametrize("page", SEARCH_PAGES)
+@pytest.mark.parametrize("chunk_size", [64, 1024, 1 << 20])
+def test_stream_matches_parse_page(page, chunk_size, dom_only):
+    pytest.importorskip("lxml")
+    body = fixture_bytes(page)
+    expected, _ = scraper.parse_page("search", body, "utf-8")
+    records, stream_parser = stream_records(body, chunk_size)
+    assert rows(records) == rows(expected)
+    assert stream_parser.result_count == len(expected)
+    assert stream_parser.error is None
+
+
+@pytest.mark.parametrize("page", SEARCH_PAGES)
+def test_stream_stops_at_pagination(page, dom_only):
+    pytest.importorskip("lxml")
+    body = fixture_bytes(page)
+    _, expected_last_page = scraper.parse_page("search", body, "utf-8")
+    records, stream_parser = stream_records(body, 64)
+    assert records
+    assert stream_parser.done
+    assert not stream_parser.read_to_end
+    # The stream stops once the pagination nav has closed, so its last page is known
+    assert expected_last_page is not None
+    assert stream_parser.last_page == expected_last_page
+
+
+def test_stream_reads_pagination_after_json_ld():
+    pytest.importorskip("lxml")
+    body = fixture_bytes("search-page.html")
+    expected, expected_last_page = scraper.parse_page("search", body, "utf-8")
+    stream_parser = scraper.SearchStreamParser("utf-8", structured=True)
+    records = []
+    stream_parser.consume([body[start:start + 64] for start in range(0, len(body), 64)], records.extend)
+    assert stream_parser.source == "json-ld"
+    assert len(records) == len(expected)
+    assert stream_parser.last_page == expected_last_page
+
+
+## Prices
+@pytest.mark.parametrize("text, expected", [
+    ("24.00", "24.00"),
+    ("1,234.56", "1234.56"),
+    ("1.234,56", "1234.56"),
+    ("12,50", "12.50"),
+    ("1,234", "1234"),
+    ("1.234", "1234"),
+    ("1.234.567", "1234567"),
+    ("1,234,567.8", "1234567.8"),
+    ("1\u00a0234,56", "1234.56"),
+    ("1 234,56", "1234.56"),
+    ("1'234.50", "1234.50"),
+    ("USD 18.90", "18.90"),
+    ("€18,90", "18.90"),
+    ("7", "7"),
+])
+def test_parse_price(text, expected):
+    assert scraper.parse_price(text) == Decimal(expected)
+
+
+def test_parse_price_forced_separator():
+    assert scraper.parse_price("1,234", ",") == Decimal("1.234")
+    assert scraper.parse_price("1.234", ".") == Decimal("1.234")
+
+
+def test_parse_price_rejects_text_without_digits():
+    with pytest.raises(ValueError):
+        scraper.parse_price("No current_price")
+
+
+@pytest.mark.parametrize("number, separator", [
+    ("1,234.56", "."),
+    ("1.234,56", ","),
+    ("12,50", ","),
+    ("12.5", "."),
+    ("1,234", "."),
+    ("1.234", ","),
+    ("1.234.567", ","),
+    ("1234", "."),
+])
+def test_infer_decimal_separator(number, separator):
+    assert scraper.infer_decimal_separator(number) == separator
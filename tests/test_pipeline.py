@@ -0,0 +1,117 @@
+import csv
+import threading
+from decimal import Decimal
+
+import pytest
+
+from scraper_module import FIXTURES, scraper
+
+
+def listing(listing_id, name="Mug"):
+    return scraper.SearchData(name=name, stars=4.5, url=f"https://www.etsy.com/listing/{listing_id}/mug", price_currency="$",
+                              listing_id=listing_id, current_price=Decimal("12.00"), original_price=Decimal("15.00"))
+
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+## Column batches
+def test_column_batch():
+    batch = scraper.ColumnBatch()
+    assert len(batch) == 0
+    batch.append(listing(1, "A"))
+    batch.append(listing(2, "B"))
+    assert len(batch) == 2
+    assert batch.record_type is scraper.SearchData
+    assert batch.columns["name"] == ["A", "B"]
+    assert batch.columns["listing_id"] == [1, 2]
+
+
+## Flushing
+@pytest.mark.parametrize("columnar", [True, False])
+def test_concurrent_flushes_write_every_record_once(tmp_path, columnar):
+    # A small queue limit makes the 16 threads flush constantly while others append
+    filename = tmp_path / "listings.csv"
+    pipeline = scraper.DataPipeline(csv_filename=str(filename), storage_queue_limit=7, columnar=columnar, dedup_key="listing_id")
+
+    def add_records(thread):
+        for i in range(300):
+            pipeline.add_batch([listing(thread * 1000 + i)])
+
+    threads = [threading.Thread(target=add_records, args=(thread,)) for thread in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pipeline.close_pipeline()
+
+    rows = csv_rows(filename)
+    assert len(rows) == 4800
+    assert len({row["listing_id"] for row in rows}) == 4800
+    assert pipeline.saved_count == 4800
+    with open(filename, encoding="utf-8") as file:
+        assert sum(line.startswith("name,") for line in file) == 1
+
+
+def test_csv_appends_across_pipelines(tmp_path):
+    filename = tmp_path / "listings.csv"
+    for listing_ids in ([1, 2], [3]):
+        pipeline = scraper.DataPipeline(csv_filename=str(filename), dedup_key="listing_id")
+        pipeline.add_batch([listing(listing_id) for listing_id in listing_ids])
+        pipeline.close_pipeline()
+    assert [row["listing_id"] for row in csv_rows(filename)] == ["1", "2", "3"]
+
+
+## Parquet
+@pytest.fixture
+def parquet(monkeypatch):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(scraper, "RECORD_FORMATS", ("csv", "parquet"))
+    return pyarrow_parquet
+
+
+def test_parquet_matches_csv_across_pipelines(tmp_path, parquet):
+    # Same-named listings share a review file: the second pipeline must add to it, not replace it
+    filename = tmp_path / "Mug.csv"
+    for names in (["Ann", "Bo"], ["Cy"]):
+        pipeline = scraper.DataPipeline(csv_filename=str(filename))
+        for name in names:
+            pipeline.add_data(scraper.ReviewData(name=name, date="Mar 3, 2026", review="Lovely", stars=5))
+        pipeline.close_pipeline()
+    table = parquet.read_table(tmp_path / "Mug.parquet")
+    assert table.column("name").to_pylist() == [row["name"] for row in csv_rows(filename)] == ["Ann", "Bo", "Cy"]
+    assert not list(tmp_path.glob("*.partial"))
+
+
+def test_parquet_concurrent_pipelines_on_one_file(tmp_path, parquet):
+    filename = tmp_path / "Mug.csv"
+
+    def save(thread):
+        pipeline = scraper.DataPipeline(csv_filename=str(filename))
+        for i in range(3):
+            pipeline.add_data(scraper.ReviewData(name=f"{thread}-{i}", date="Mar 3, 2026", review="Lovely", stars=5))
+        pipeline.close_pipeline()
+
+    threads = [threading.Thread(target=save, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(parquet.read_table(tmp_path / "Mug.parquet").column("name").to_pylist()) == sorted(row["name"] for row in csv_rows(filename))
+    assert parquet.read_table(tmp_path / "Mug.parquet").num_rows == 24
+
+
+@pytest.mark.parametrize("coerce_types", [True, False])
+def test_parquet_schema_follows_coercion(tmp_path, parquet, monkeypatch, coerce_types):
+    monkeypatch.setattr(scraper, "COERCE_TYPES", coerce_types)
+    records, _ = scraper.parse_page("search", (FIXTURES / "search-page.html").read_bytes(), "utf-8")
+    pipeline = scraper.DataPipeline(csv_filename=str(tmp_path / "listings.csv"), dedup_key="listing_id")
+    pipeline.add_batch(records)
+    pipeline.close_pipeline()
+    schema = parquet.read_table(tmp_path / "listings.parquet").schema
+    # Stars are parsed as floats either way; ids and prices stay text until coerced
+    assert str(schema.field("stars").type) == "double"
+    assert str(schema.field("listing_id").type) == ("int64" if coerce_types else "string")
+    assert str(schema.field("current_price").type) == ("decimal128(38, 6)" if coerce_types else "string")